@@ -553,7 +553,7 @@ protected function readHourIndex(string $source, string $hour, string $rendition
         $contents = Cache::get($key);
 
         if ($contents === null) {
-            $contents = $this->fetchHourIndex($path);
+            $contents = $this->fetchHourIndex($path, $hour);
 
             // An absent hour is cached as an empty body, because null is indistinguishable
             // from a miss and would refetch on every request. It is held for half a minute
@@ -568,11 +568,85 @@ protected function readHourIndex(string $source, string $hour, string $rendition
         return $contents === '' ? [] : $this->parseHourIndex($contents);
     }
 
-    /** The index body, or null when the archive holds no such hour. */
-    protected function fetchHourIndex(string $path): ?string
+    /**
+     * The index body, or null when the archive holds no such hour.
+     *
+     * An hour the uploader is still writing is not at $path yet but in part objects
+     * beside it, which it compacts into $path once the hour is over. Recent hours look
+     * for parts first, because a part can be newer than an index.m3u8 written before
+     * the uploader switched formats; settled ones for the index first, falling back to
+     * parts only where an uploader that was down never compacted them.
+     */
+    protected function fetchHourIndex(string $path, string $hour): ?string
+    {
+        if ($this->hourIsRecent($hour)) {
+            return $this->fetchIndexParts($path) ?? $this->fetchObject($path);
+        }
+
+        return $this->fetchObject($path) ?? $this->fetchIndexParts($path);
+    }
+
+    /**
+     * An open hour index reassembled from its parts: `index.parts/<byte offset>`, the
+     * offsets zero-padded so they list in file order.
+     *
+     * The uploader merges parts as they accumulate by overwriting the first and then
+     * deleting the rest, so a listing can return parts that overlap or one that is gone
+     * by the time it is fetched. Bytes already covered by an earlier offset are skipped,
+     * which makes both harmless. A gap is not, and means the listing is out of date, so
+     * that reads as no parts at all.
+     */
+    protected function fetchIndexParts(string $path): ?string
+    {
+        $directory = preg_replace('/\.m3u8$/', '.parts', $path);
+
+        try {
+            $parts = Storage::disk($this->disk)->files($directory);
+        } catch (\Throwable) {
+            return null;
+        }
+
+        if ($parts === []) {
+            return null;
+        }
+
+        sort($parts);
+        $contents = '';
+
+        foreach ($parts as $part) {
+            $offset = (int) basename($part);
+
+            if ($offset > strlen($contents)) {
+                return null;
+            }
+
+            $body = $this->fetchObject($part);
+
+            if ($body !== null) {
+                $contents .= substr($body, strlen($contents) - $offset);
+            }
+        }
+
+        return $contents === '' ? null : $contents;
+    }
+
+    /**
+     * An object's body, gunzipped if need be, or null when there is no such object.
+     *
+     * Closed hours are stored gzipped as Content-Encoding: gzip. Whether the HTTP client
+     * has already undone that depends on the driver and its options, so this goes by the
+     * bytes rather than the header: a playlist starts with #EXTM3U, never the gzip magic.
+     */
+    protected function fetchObject(string $path): ?string
     {
         try {
-            return Storage::disk($this->disk)->get($path);
+            $body = Storage::disk($this->disk)->get($path);
+
+            if ($body !== null && str_starts_with($body, "\x1f\x8b")) {
+                $body = gzdecode($body);
+            }
+
+            return $body === false ? null : $body;
         } catch (\Throwable) {
             return null;
         }
@@ -588,9 +662,13 @@ protected function fetchHourIndex(string $path): ?string
      */
     protected function indexCacheTtl(string $hour): int
     {
-        $settled = CarbonImmutable::now()->utc()->subHours(2)->format('Ymd/H');
+        return $this->hourIsRecent($hour) ? 30 : $this->playlistCacheTtl();
+    }
 
-        return $hour >= $settled ? 30 : $this->playlistCacheTtl();
+    /** Whether the uploader may still be writing to an hour, or only just stopped. */
+    protected function hourIsRecent(string $hour): bool
+    {
+        return $hour >= CarbonImmutable::now()->utc()->subHours(2)->format('Ymd/H');
     }
 
     /** Drops the cached hour indexes a range reads, so the next read goes to the archive. */
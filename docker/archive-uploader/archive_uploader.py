@@ -22,20 +22,39 @@ directory and the same parse of the playlists:
 
 Correctness rests on a reconciling sweep rather than inotify. Segments arrive every
 two seconds, so a short polling interval is both simpler and sufficient, and a sweep
-recovers from a crash without needing to have observed the events it missed.
+recovers from a crash without needing to have observed the events it missed. With
+SWEEP_MODE=inotify, playlist changes trigger a sweep of just that source, for
+latency; the reconciling sweep stays, less often, as what correctness rests on.
 """
 
+import asyncio
+import base64
+import bisect
+import ctypes
+import ctypes.util
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import logging
+import mmap
 import os
+import queue
+import select
 import sqlite3
+import struct
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import boto3
 from botocore.config import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
 logging.basicConfig(
     level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
@@ -75,7 +94,29 @@ INDEX_PATH = os.environ.get('INDEX_PATH', '/var/lib/dvr-archive/index')
 MANIFEST_DB = os.environ.get('MANIFEST_DB', '/var/lib/dvr-archive/manifest.sqlite')
 
 SWEEP_INTERVAL = int(os.environ.get('SWEEP_INTERVAL', '5'))
+
+# `inotify` sweeps a source as soon as one of its playlists is rewritten, instead of
+# waiting for the next SWEEP_INTERVAL, and keeps the full reconciling sweep only as
+# the backstop, every RECONCILE_INTERVAL. `poll` is the sweep alone. inotify that
+# cannot be set up (not Linux, out of watches) falls back to polling.
+SWEEP_MODE = os.environ.get('SWEEP_MODE', 'poll')
+RECONCILE_INTERVAL = int(os.environ.get('RECONCILE_INTERVAL', '60'))
 INDEX_UPLOAD_INTERVAL = int(os.environ.get('INDEX_UPLOAD_INTERVAL', '60'))
+
+# An hour index is uploaded as append-only part objects while its hour is open, and
+# compacted into the one index.m3u8 once the hour has been over for this long. The
+# grace covers a backlog still indexing into it, and the publisher's clock, which
+# PDT follows, running behind ours. See Indexer.flush.
+INDEX_CLOSE_GRACE = int(os.environ.get('INDEX_CLOSE_GRACE', '600'))
+
+# Store closed hour indexes gzipped, as Content-Encoding: gzip. The same tags and %v
+# names every two seconds compress about tenfold, and a cut spanning a day reads 24
+# of them. The local copy in INDEX_PATH and the open hour's parts stay plain.
+INDEX_GZIP = os.environ.get('INDEX_GZIP', '1') not in ('0', 'false', 'False', '')
+
+# fsync each hour index after appending to it. Off by default: the manifest is what
+# a crash is recovered from, and a lost tail is rewritten from the live playlist.
+INDEX_FSYNC = os.environ.get('INDEX_FSYNC', '0') not in ('0', 'false', 'False', '')
 REAP_INTERVAL = int(os.environ.get('REAP_INTERVAL', '120'))
 
 # A segment is never deleted locally while it is still inside the live rewind window,
@@ -87,24 +128,117 @@ REAP_INTERVAL = int(os.environ.get('REAP_INTERVAL', '120'))
 # ever drift, drift upwards.
 DVR_WINDOW_SECONDS = int(os.environ.get('DVR_WINDOW_SECONDS', '3600'))
 
+# The one exception: when the HLS volume runs out of space, the window is given up
+# in steps rather than the origin. Each step is `free percent:fraction of the
+# window`, so with the defaults the window halves below 15% free, quarters below
+# 10%, and drops to DVR_WINDOW_FLOOR_SECONDS below 5%. Viewers lose rewind, not the
+# stream. Only segments S3 has confirmed are ever reaped, at any step: when nothing
+# verified is left to delete, the watchdog can only alert.
+#
+# A step is left once free space is DISK_PRESSURE_HYSTERESIS points above where it
+# was entered, so the window does not flap around a threshold.
+DISK_PRESSURE_STEPS = sorted(
+    ((float(percent), float(fraction)) for percent, _, fraction in (
+        step.partition(':')
+        for step in os.environ.get('DISK_PRESSURE_STEPS', '15:0.5,10:0.25,5:0').split(',')
+        if step
+    )),
+    reverse=True,
+)
+DISK_PRESSURE_HYSTERESIS = float(os.environ.get('DISK_PRESSURE_HYSTERESIS', '3'))
+DVR_WINDOW_FLOOR_SECONDS = int(os.environ.get('DVR_WINDOW_FLOOR_SECONDS', '60'))
+DISK_CHECK_INTERVAL = int(os.environ.get('DISK_CHECK_INTERVAL', '10'))
+
 MAX_CONCURRENT_UPLOADS = int(os.environ.get('MAX_CONCURRENT_UPLOADS', '5'))
 
+# How segment uploads are driven. `threads` is MAX_CONCURRENT_UPLOADS workers, one
+# blocking boto3 call each. `async` is one event loop (aiobotocore) keeping
+# ASYNC_UPLOAD_CONCURRENCY uploads in flight over a pool of keep-alive connections,
+# with ASYNC_BLOCKING_THREADS for file reads and the manifest. Without aiobotocore
+# installed, `async` falls back to threads.
+S3_ENGINE = os.environ.get('S3_ENGINE', 'threads')
+ASYNC_UPLOAD_CONCURRENCY = int(os.environ.get('ASYNC_UPLOAD_CONCURRENCY', '64'))
+ASYNC_BLOCKING_THREADS = int(os.environ.get('ASYNC_BLOCKING_THREADS', '4'))
+
+# How much younger a redundant ladder rendition is treated as than it is, when the
+# upload queue decides what goes next. The canonical rendition carries the index and
+# the source rendition is the only copy at contribution quality, so under a backlog
+# they go first - but only by this much, so the rest of the ladder still drains
+# oldest first instead of starving until the disk fills.
+REDUNDANT_RENDITION_LAG = int(os.environ.get('REDUNDANT_RENDITION_LAG', '60'))
+
 # Ceiling on upload bandwidth, so continuous archive traffic cannot starve the edge
 # of the origin's uplink. 0 disables the limit. Replaces MAX_UPLOAD_RATE_MBPS, which
 # was configured on the origin for a long time but never actually read.
 MAX_UPLOAD_RATE_MBPS = float(os.environ.get('MAX_UPLOAD_RATE_MBPS', '0'))
 
+# How that ceiling is divided when it binds. Every source gets a share in proportion
+# to its weight here (`main=2,stage=1`; unlisted sources weigh 1), split between its
+# ladder and its source archive, the latter at SOURCE_ARCHIVE_SHARE of the ladder's
+# weight. Shares are only ever divided among sources actually uploading, so one that
+# is idle lends its share to the rest rather than leaving it unused.
+#
+# Without this, one contribution at 40 Mbps takes most of the cap simply by having
+# the most bytes queued, and a ladder source behind it drifts towards its reap
+# horizon with nothing wrong with it.
+UPLOAD_SHARES = {
+    name.strip(): float(weight)
+    for name, _, weight in (
+        item.partition('=') for item in os.environ.get('UPLOAD_SHARES', '').split(',')
+    )
+    if name.strip() and weight
+}
+SOURCE_ARCHIVE_SHARE = float(os.environ.get('SOURCE_ARCHIVE_SHARE', '1'))
+
+# How an upload is confirmed before its segment becomes reapable.
+#
+#   md5     send Content-MD5, so S3 refuses a body that arrived damaged, and take the
+#           PUT's ETag - the MD5 of what it stored - as proof. No extra request.
+#   sha256  the same with an S3 additional checksum, for endpoints that want one.
+#   head    put, then head_object and compare sizes: a second round trip per
+#           segment, kept for endpoints that honour neither.
+#
+# A PUT whose response does not carry the expected proof (an ETag that is not the
+# MD5 under SSE-KMS, a checksum the endpoint ignored) falls back to the HEAD for
+# that segment, so choosing wrong costs requests, never a false confirmation.
+UPLOAD_VERIFY = os.environ.get('UPLOAD_VERIFY', 'md5')
+
+# Segments at least this large go up as a multipart upload, in parallel parts, and a
+# crash mid-upload resumes from the parts S3 already has. Only the source rendition
+# gets anywhere near it: it is cut on the publisher's GOP, up to 10s of whatever
+# they send. The ladder's 2s segments are a few MB at most and stay a single PUT.
+# Parts must be at least 5 MiB, bar the last, which is S3's rule rather than ours.
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD_MB', '16')) * 1024 * 1024
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_MB', '8')) * 1024 * 1024
+MULTIPART_CONCURRENCY = int(os.environ.get('MULTIPART_CONCURRENCY', '4'))
+
 RENDITIONS = [r for r in os.environ.get('ARCHIVE_RENDITIONS', 'sd,hd,fhd').split(',') if r]
 
 # Which rendition's playlist is treated as authoritative for timing. The others are
 # checked against it rather than parsed independently.
 CANONICAL_RENDITION = os.environ.get('CANONICAL_RENDITION', 'hd')
 
+# Warn when the origin disk is projected to fill within this many hours. The
+# projection is free space on the HLS_PATH volume over what ingest is outrunning
+# uploads by, both measured over the last BACKLOG_MODEL_WINDOW seconds.
+DISK_FULL_WARN_HOURS = float(os.environ.get('DISK_FULL_WARN_HOURS', '6'))
+BACKLOG_MODEL_WINDOW = int(os.environ.get('BACKLOG_MODEL_WINDOW', '300'))
+
+# Prometheus text-format metrics on http://METRICS_HOST:METRICS_PORT/metrics. 0 turns
+# the endpoint off. It listens on loopback unless told otherwise; set METRICS_HOST to
+# 0.0.0.0 to scrape it over the compose network. Nothing publishes the port.
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9108'))
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+
 boto_config = Config(
     max_pool_connections=100,
     retries={'max_attempts': 5, 'mode': 'adaptive'},
     read_timeout=120,
     connect_timeout=30,
+    # Every PUT already carries the UPLOAD_VERIFY digest. Left at its default,
+    # botocore adds a CRC32 of its own: another pass over the body, sent as an
+    # aws-chunked trailer, which means copying the body into its chunk framing.
+    request_checksum_calculation='when_required',
 )
 
 _s3_kwargs = {'region_name': S3_REGION, 'config': boto_config}
@@ -116,19 +250,131 @@ if S3_ENDPOINT:
 
 s3 = boto3.client('s3', **_s3_kwargs)
 
-upload_semaphore = threading.Semaphore(MAX_CONCURRENT_UPLOADS)
+# What an S3 call raises when it fails: ClientError for an error response, and
+# BotoCoreError for one that never came - a refused connection, a timeout.
+S3_ERRORS = (ClientError, BotoCoreError)
 
-# Paths a worker thread currently owns. See dispatch_uploads.
+# Paths queued for or being uploaded by a worker. See dispatch_uploads.
 inflight = set()
 inflight_lock = threading.Lock()
 
-rate_limiter_lock = threading.Lock()
-_rate_tokens = {'bytes': 0.0, 'at': time.monotonic()}
-
 metrics = {'indexed': 0, 'uploaded': 0, 'verified': 0, 'reaped': 0, 'failed': 0}
 metrics_lock = threading.Lock()
 
 
+# ----------------------------------------------------------------------- metrics
+
+class Histogram:
+    """
+    A Prometheus histogram, per label set, behind one lock.
+
+    Hand-rolled rather than prometheus_client because the image installs nothing
+    but boto3, and the exposition format is a few lines of text. Counts are kept
+    per bucket and made cumulative when scraped, so observe() is one bisect and
+    three additions.
+    """
+
+    LATENCY = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, doc, labels, buckets=LATENCY):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        HISTOGRAMS.append(self)
+
+    def observe(self, value, *labels):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, *labels)
+
+    def expose(self):
+        with self._lock:
+            series = {labels: list(counts) for labels, counts in self._series.items()}
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} histogram']
+        for labels, counts in sorted(series.items()):
+            pairs = list(zip(self.labels, labels))
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append(f'{self.name}_bucket{_labels(pairs + [("le", bound)])} {running}')
+            running += counts[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_labels(pairs + [("le", "+Inf")])} {running}')
+            lines.append(f'{self.name}_sum{_labels(pairs)} {counts[-1]}')
+            lines.append(f'{self.name}_count{_labels(pairs)} {running}')
+        return lines
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def segment_labels(path):
+    """(source, rendition) from a segment's file name or S3 key."""
+    # {source}_{rendition}_{session}_{n}, and a source name may hold underscores.
+    source, _, rendition = Path(path).stem.rsplit('_', 2)[0].rpartition('_')
+    return source, rendition
+
+
+HISTOGRAMS = []
+
+sweep_seconds = Histogram(
+    'archive_uploader_sweep_seconds',
+    'One source\'s share of a sweep: parse, index and enqueue.',
+    ('source',),
+)
+parse_seconds = Histogram(
+    'archive_uploader_playlist_parse_seconds',
+    'Reading one rendition playlist.',
+    ('source', 'rendition'),
+)
+manifest_seconds = Histogram(
+    'archive_uploader_manifest_query_seconds',
+    'Manifest calls, by method. Inside a sweep the commit is paid at the end of it.',
+    ('query',),
+)
+s3_seconds = Histogram(
+    'archive_uploader_s3_request_seconds',
+    'S3 requests for segments, by operation.',
+    ('operation', 'source', 'rendition'),
+)
+upload_rate = Histogram(
+    'archive_uploader_upload_bytes_per_second',
+    'Throughput of each segment upload, first byte read to confirmation.',
+    ('source', 'rendition'),
+    buckets=(1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 1e9),
+)
+
+
+def _timed(fn):
+    """Manifest methods land in manifest_seconds under their own name."""
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        with manifest_seconds.time(fn.__name__):
+            return fn(*args, **kwargs)
+    return timed
+
+
 # ---------------------------------------------------------------------- manifest
 
 class Manifest:
@@ -139,13 +385,26 @@ class Manifest:
     the same playlist entries every few seconds and must converge rather than
     duplicate. A crash costs at most the in-flight uploads, which the next sweep
     picks up again.
+
+    Most of what a sweep asks is whether it has seen a segment before, and almost
+    always it has, five seconds ago. Those answers come from two in-memory sets
+    rather than from sqlite, which stays the durable record:
+
+      _known      every path with a segments row. Complete: it is loaded whole at
+                  startup and every insert and delete goes through here, so a miss
+                  is a real miss.
+      _indexed    (source, session, n) for what has been indexed recently. Only a
+                  window, because the table itself is never pruned and a con's worth
+                  of it does not belong in memory, so a miss is checked in sqlite.
+
+    Both change only once the write they mirror has committed.
     """
 
     def __init__(self, path):
         Path(path).parent.mkdir(parents=True, exist_ok=True)
         self._local = threading.local()
         self._path = path
-        with self._conn() as c:
+        with self._tx() as c:
             c.executescript("""
                 CREATE TABLE IF NOT EXISTS segments (
                     path        TEXT PRIMARY KEY,
@@ -154,7 +413,9 @@ class Manifest:
                     size        INTEGER,
                     etag        TEXT,
                     uploaded_at REAL,
-                    verified_at REAL
+                    verified_at REAL,
+                    captured_at REAL,
+                    rendition   TEXT
                 );
                 CREATE INDEX IF NOT EXISTS segments_verified
                     ON segments (verified_at);
@@ -174,7 +435,100 @@ class Manifest:
                     source   TEXT PRIMARY KEY,
                     next_seq INTEGER NOT NULL
                 );
+
+                -- Multipart uploads in progress, and the parts S3 has acknowledged,
+                -- so a restart resumes one rather than sending it all again.
+                CREATE TABLE IF NOT EXISTS multipart (
+                    path      TEXT PRIMARY KEY,
+                    upload_id TEXT NOT NULL,
+                    part_size INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS parts (
+                    path   TEXT NOT NULL,
+                    number INTEGER NOT NULL,
+                    etag   TEXT NOT NULL,
+                    PRIMARY KEY (path, number)
+                );
+
+                -- The part objects an open hour index is in S3 as, by byte range of
+                -- the local file, until it is compacted. See Indexer.flush.
+                CREATE TABLE IF NOT EXISTS index_parts (
+                    source  TEXT NOT NULL,
+                    hour    TEXT NOT NULL,
+                    name    TEXT NOT NULL,
+                    start   INTEGER NOT NULL,
+                    bytes   INTEGER NOT NULL,
+                    flushes INTEGER NOT NULL,
+                    PRIMARY KEY (source, hour, name, start)
+                );
             """)
+            self._migrate(c)
+
+        self._seen_lock = threading.Lock()
+        self._known = set()
+        self._indexed = set()
+        self._warm()
+
+    def _migrate(self, c):
+        """
+        captured_at arrived after manifests were already in service. Rows from before
+        it get their file's mtime once, here, which is what the reaper used to stat
+        for on every pass; a file that is already gone gets now, and is forgotten
+        by the reaper soon enough.
+        """
+        columns = {row[1] for row in c.execute('PRAGMA table_info(segments)')}
+        if 'captured_at' not in columns:
+            c.execute('ALTER TABLE segments ADD COLUMN captured_at REAL')
+
+        legacy = [row[0] for row in c.execute(
+            'SELECT path FROM segments WHERE captured_at IS NULL'
+        )]
+        if legacy:
+            logger.info('Manifest: recording capture time for %d existing segment(s)',
+                        len(legacy))
+            c.executemany(
+                'UPDATE segments SET captured_at = ? WHERE path = ?',
+                ((_mtime(path), path) for path in legacy),
+            )
+
+        # Partial, so it holds only what the reaper can act on.
+        c.execute(
+            'CREATE INDEX IF NOT EXISTS segments_reapable ON segments (captured_at) '
+            'WHERE verified_at IS NOT NULL'
+        )
+
+        # rendition is for oldest_unverified(), so only rows not yet verified need it.
+        if 'rendition' not in columns:
+            c.execute('ALTER TABLE segments ADD COLUMN rendition TEXT')
+            c.executemany(
+                'UPDATE segments SET rendition = ? WHERE path = ?',
+                ((segment_labels(path)[1], path) for (path,) in c.execute(
+                    'SELECT path FROM segments WHERE verified_at IS NULL'
+                ).fetchall()),
+            )
+        c.execute(
+            'CREATE INDEX IF NOT EXISTS segments_unverified '
+            'ON segments (source, rendition, captured_at) WHERE verified_at IS NULL'
+        )
+
+    def _warm(self):
+        """
+        Load the in-memory sets. _indexed only needs what a playlist can still list,
+        which is the local window; the extra hour covers PDT running behind the
+        origin's clock, which is what the hour column is bucketed by.
+        """
+        horizon = datetime.now(timezone.utc) - timedelta(seconds=DVR_WINDOW_SECONDS + 3600)
+        with self._tx() as c:
+            known = {row[0] for row in c.execute('SELECT path FROM segments')}
+            indexed = set(c.execute(
+                'SELECT source, session, n FROM indexed WHERE hour >= ?',
+                (horizon.strftime('%Y%m%d/%H'),),
+            ))
+        with self._seen_lock:
+            self._known = known
+            self._indexed = indexed
+        logger.info('Manifest: %d segment(s) tracked, %d recent index entries',
+                    len(known), len(indexed))
 
     def _conn(self):
         # sqlite connections are not shareable across threads.
@@ -183,9 +537,54 @@ class Manifest:
             self._local.conn.execute('PRAGMA journal_mode=WAL')
         return self._local.conn
 
+    @contextmanager
+    def _tx(self):
+        """A transaction of its own, unless batch() already holds one on this thread."""
+        conn = self._conn()
+        if getattr(self._local, 'depth', 0):
+            yield conn
+        else:
+            with conn:
+                yield conn
+
+    def _on_commit(self, fn):
+        """Run `fn` once the current transaction has committed, so the in-memory sets
+        never claim a row that a rolled-back batch did not write."""
+        if getattr(self._local, 'depth', 0):
+            self._local.staged.append(fn)
+        else:
+            fn()
+
+    @contextmanager
+    def batch(self):
+        """
+        Everything inside commits once, at the end.
+
+        The sweep re-reads ~900 entries per rendition per source every few seconds,
+        and as one transaction per call that was tens of thousands of commits a pass,
+        each an fsync. A whole source's worth of bookkeeping is one unit of work
+        anyway: if the process dies halfway, the next sweep redoes it from the same
+        playlists.
+        """
+        conn = self._conn()
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        try:
+            if depth:
+                yield
+            else:
+                self._local.staged = []
+                with conn:
+                    yield
+                for fn in self._local.staged:
+                    fn()
+        finally:
+            self._local.depth = depth
+
+    @_timed
     def next_seq(self, source, count=1):
         """Reserve `count` ordering keys for a source."""
-        with self._conn() as c:
+        with self._tx() as c:
             row = c.execute(
                 'SELECT next_seq FROM counters WHERE source = ?', (source,)
             ).fetchone()
@@ -197,65 +596,239 @@ class Manifest:
             )
         return start
 
-    def already_indexed(self, source, session, n):
-        with self._conn() as c:
-            return c.execute(
-                'SELECT 1 FROM indexed WHERE source = ? AND session = ? AND n = ?',
-                (source, session, n),
-            ).fetchone() is not None
-
-    def record_indexed(self, source, session, n, seq, hour):
-        with self._conn() as c:
-            c.execute(
+    @_timed
+    def already_indexed_many(self, source, keys):
+        """The subset of (session, n) pairs already indexed for a source."""
+        keys = list(keys)
+        with self._seen_lock:
+            found = {k for k in keys if (source, *k) in self._indexed}
+        missing = [k for k in keys if k not in found]
+        if not missing:
+            return found
+
+        ranges = {}
+        for session, n in missing:
+            low, high = ranges.get(session, (n, n))
+            ranges[session] = (min(low, n), max(high, n))
+
+        # A playlist holds one or two sessions, each a contiguous run of n, so one
+        # range scan of the primary key per session covers the whole window.
+        stored = set()
+        with self._tx() as c:
+            for session, (low, high) in ranges.items():
+                stored.update(c.execute(
+                    'SELECT session, n FROM indexed '
+                    'WHERE source = ? AND session = ? AND n BETWEEN ? AND ?',
+                    (source, session, low, high),
+                ))
+        stored.intersection_update(missing)
+        if stored:
+            with self._seen_lock:
+                self._indexed.update((source, *k) for k in stored)
+        return found | stored
+
+    @_timed
+    def record_indexed_many(self, source, rows):
+        """`rows` are (session, n, seq, hour)."""
+        rows = list(rows)
+        with self._tx() as c:
+            c.executemany(
                 'INSERT OR IGNORE INTO indexed (source, session, n, seq, hour) '
                 'VALUES (?, ?, ?, ?, ?)',
-                (source, session, n, seq, hour),
+                ((source, *row) for row in rows),
             )
-
-    def known(self, path):
-        with self._conn() as c:
-            return c.execute(
-                'SELECT 1 FROM segments WHERE path = ?', (str(path),)
-            ).fetchone() is not None
-
-    def record_pending(self, path, key, source):
-        with self._conn() as c:
-            c.execute(
-                'INSERT OR IGNORE INTO segments (path, key, source) VALUES (?, ?, ?)',
-                (str(path), key, source),
+        self._on_commit(lambda: self._remember(
+            indexed=[(source, session, n) for session, n, _, _ in rows]
+        ))
+
+    def known_many(self, paths):
+        """The subset of `paths` the manifest already has a row for, as strings."""
+        with self._seen_lock:
+            return {str(p) for p in paths if str(p) in self._known}
+
+    @_timed
+    def record_pending_many(self, rows):
+        """`rows` are (path, key, source, captured_at)."""
+        rows = [(str(path), *rest, segment_labels(path)[1]) for path, *rest in rows]
+        with self._tx() as c:
+            c.executemany(
+                'INSERT OR IGNORE INTO segments (path, key, source, captured_at, rendition) '
+                'VALUES (?, ?, ?, ?, ?)', rows
             )
+        self._on_commit(lambda: self._remember(known=[row[0] for row in rows]))
 
+    def _remember(self, known=(), indexed=()):
+        with self._seen_lock:
+            self._known.update(known)
+            self._indexed.update(indexed)
+
+    @_timed
     def record_verified(self, path, size, etag):
-        with self._conn() as c:
+        with self._tx() as c:
             c.execute(
                 'UPDATE segments SET size = ?, etag = ?, uploaded_at = ?, '
                 'verified_at = ? WHERE path = ?',
                 (size, etag, time.time(), time.time(), str(path)),
             )
 
+    @_timed
     def pending_uploads(self, limit=500):
-        with self._conn() as c:
+        """Oldest first: rows are inserted in the order segments are observed."""
+        with self._tx() as c:
             return c.execute(
-                'SELECT path, key, source FROM segments WHERE verified_at IS NULL '
-                'LIMIT ?', (limit,)
+                'SELECT path, key, source, captured_at FROM segments '
+                'WHERE verified_at IS NULL ORDER BY rowid LIMIT ?', (limit,)
             ).fetchall()
 
+    @_timed
     def pending_count(self):
-        with self._conn() as c:
+        with self._tx() as c:
             return c.execute(
                 'SELECT COUNT(*) FROM segments WHERE verified_at IS NULL'
             ).fetchone()[0]
 
-    def reapable(self, limit=2000):
-        with self._conn() as c:
+    @_timed
+    def oldest_unverified(self):
+        """
+        {(source, rendition): oldest captured_at} over segments not yet verified.
+
+        Through an S3 outage every segment stays unverified, so this must not read
+        them all: the sources are a skip through segments_unverified, a lookup each,
+        and each rendition's oldest is the first entry of its range in the same index.
+        """
+        oldest = {}
+        with self._tx() as c:
+            sources = [row[0] for row in c.execute("""
+                WITH RECURSIVE sources(source) AS (
+                    SELECT MIN(source) FROM segments INDEXED BY segments_unverified
+                    WHERE verified_at IS NULL
+                    UNION ALL
+                    SELECT (SELECT MIN(source) FROM segments INDEXED BY segments_unverified
+                            WHERE verified_at IS NULL AND source > sources.source)
+                    FROM sources WHERE source IS NOT NULL
+                )
+                SELECT source FROM sources WHERE source IS NOT NULL
+            """)]
+            for source in sources:
+                for rendition in (*RENDITIONS, SOURCE_RENDITION):
+                    captured = c.execute(
+                        'SELECT MIN(captured_at) FROM segments INDEXED BY segments_unverified '
+                        'WHERE verified_at IS NULL AND source = ? AND rendition = ?',
+                        (source, rendition),
+                    ).fetchone()[0]
+                    if captured is not None:
+                        oldest[(source, rendition)] = captured
+        return oldest
+
+    @_timed
+    def reapable(self, captured_before, limit=2000):
+        """
+        Verified segments captured before the given time, oldest first.
+
+        Filtering by age here rather than in the reaper is what keeps it moving:
+        with more verified segments inside the window than `limit`, an arbitrary
+        `limit` of them could all be too young, pass after pass.
+        """
+        with self._tx() as c:
             return c.execute(
-                'SELECT path, key, size FROM segments WHERE verified_at IS NOT NULL '
-                'LIMIT ?', (limit,)
+                'SELECT path, key, size FROM segments '
+                'WHERE verified_at IS NOT NULL AND captured_at < ? '
+                'ORDER BY captured_at LIMIT ?', (captured_before, limit)
             ).fetchall()
 
+    @_timed
     def forget(self, path):
-        with self._conn() as c:
+        with self._tx() as c:
             c.execute('DELETE FROM segments WHERE path = ?', (str(path),))
+        self._on_commit(lambda: self._prune(str(path)))
+
+    def multipart(self, path):
+        """(upload_id, part_size, {number: etag}) for an upload in progress, or None."""
+        with self._tx() as c:
+            row = c.execute(
+                'SELECT upload_id, part_size FROM multipart WHERE path = ?', (str(path),)
+            ).fetchone()
+            if row is None:
+                return None
+            parts = dict(c.execute(
+                'SELECT number, etag FROM parts WHERE path = ?', (str(path),)
+            ))
+        return row[0], row[1], parts
+
+    def begin_multipart(self, path, upload_id, part_size):
+        with self._tx() as c:
+            c.execute(
+                'INSERT OR REPLACE INTO multipart (path, upload_id, part_size) '
+                'VALUES (?, ?, ?)', (str(path), upload_id, part_size),
+            )
+            c.execute('DELETE FROM parts WHERE path = ?', (str(path),))
+
+    def record_part(self, path, number, etag):
+        with self._tx() as c:
+            c.execute(
+                'INSERT OR REPLACE INTO parts (path, number, etag) VALUES (?, ?, ?)',
+                (str(path), number, etag),
+            )
+
+    def end_multipart(self, path):
+        with self._tx() as c:
+            c.execute('DELETE FROM multipart WHERE path = ?', (str(path),))
+            c.execute('DELETE FROM parts WHERE path = ?', (str(path),))
+
+    def index_parts(self, source, hour, name):
+        """[(start, bytes, flushes)] of an hour index's part objects, in file order."""
+        with self._tx() as c:
+            return c.execute(
+                'SELECT start, bytes, flushes FROM index_parts '
+                'WHERE source = ? AND hour = ? AND name = ? ORDER BY start',
+                (source, hour, name),
+            ).fetchall()
+
+    def chunked_indexes(self):
+        """(source, hour, name) of every hour index that still has part objects."""
+        with self._tx() as c:
+            return c.execute(
+                'SELECT DISTINCT source, hour, name FROM index_parts'
+            ).fetchall()
+
+    def record_index_part(self, source, hour, name, start, size, flushes):
+        """A part object covering [start, start + size), replacing any it covers."""
+        with self._tx() as c:
+            c.execute(
+                'DELETE FROM index_parts WHERE source = ? AND hour = ? AND name = ? '
+                'AND start >= ?', (source, hour, name, start),
+            )
+            c.execute(
+                'INSERT INTO index_parts (source, hour, name, start, bytes, flushes) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (source, hour, name, start, size, flushes),
+            )
+
+    def end_index_parts(self, source, hour, name):
+        with self._tx() as c:
+            c.execute(
+                'DELETE FROM index_parts WHERE source = ? AND hour = ? AND name = ?',
+                (source, hour, name),
+            )
+
+    def _prune(self, path):
+        """
+        Drop a forgotten segment from both sets. Its index key goes too: a segment is
+        only forgotten once it has left every playlist, so nothing will ask about it
+        again, and if something did the miss would be answered from sqlite.
+        """
+        # prime_hd_1785710235_000042.ts -> (prime, hd, 1785710235, 42)
+        try:
+            source, rendition, session, n = Path(path).stem.rsplit('_', 3)
+            key = (source, session, int(n))
+        except ValueError:
+            key = None
+        if key and rendition == SOURCE_RENDITION:
+            key = (f'{source}#{SOURCE_RENDITION}', session, key[2])
+
+        with self._seen_lock:
+            self._known.discard(path)
+            if key:
+                self._indexed.discard(key)
 
 
 # ------------------------------------------------------------- playlist parsing
@@ -281,7 +854,8 @@ class Entry:
     def hour(self):
         """Bucket by the segment's start, so a segment straddling the boundary
         belongs to the earlier hour."""
-        return self.pdt.strftime('%Y%m%d/%H')
+        pdt = self.pdt
+        return '%04d%02d%02d/%02d' % (pdt.year, pdt.month, pdt.day, pdt.hour)
 
     def generic_name(self):
         """Name with the rendition replaced by %v, so one index entry covers all."""
@@ -302,12 +876,18 @@ def parse_playlist(path):
     except (OSError, UnicodeDecodeError):
         return [], 0
 
+    entries = parse_entries(text.splitlines())
+    return entries, max(0, len(entries) - 1)
+
+
+def parse_entries(lines):
+    """The segments described by `lines`, which start on an entry boundary."""
     entries = []
     duration = None
     pdt = None
     discontinuity = False
 
-    for line in text.splitlines():
+    for line in lines:
         line = line.strip()
         if not line:
             continue
@@ -330,7 +910,150 @@ def parse_playlist(path):
             pdt = None
             discontinuity = False
 
-    return entries, max(0, len(entries) - 1)
+    return entries
+
+
+class PlaylistFollower:
+    """
+    parse_playlist() for a playlist read every few seconds, parsing only what is new.
+
+    A 30 minute window is ~900 entries and ~90 KB per rendition, and between two
+    sweeps one or two of them change. Re-parsing the rest - a PDT each - is what made
+    sweep CPU grow with the window rather than with the segments arriving. So this
+    remembers, per playlist, the file it read (inode, size, mtime), its media
+    sequence, the entries it held and the byte offset just past the last one, and
+    resumes from there:
+
+      unchanged       stat matches; nothing is read at all
+      appended        same media sequence, larger file: only the new bytes are read,
+                      which is every write until the window fills
+      window slid     FFmpeg rewrote the playlist with the head dropped. The file has
+                      to be read again, but only the entries after the last one seen
+                      are parsed; the ones dropped come off the front of the list
+      anything else   a new session, a replaced file, a window that moved further
+                      than was remembered: parse it whole, as parse_playlist() does
+
+    Each resume is checked against the file rather than assumed - the last entry
+    seen must sit where it is expected, and the entry count must add up - and falls
+    back to a full parse when it does not. The result is what parse_playlist() would
+    have returned, except that a line caught half-written is left for the next read
+    rather than taken as an entry.
+    """
+
+    # The media sequence is in the header, which is well inside this.
+    HEAD = 1024
+
+    def __init__(self):
+        self._state = {}
+
+    def read(self, path):
+        """Same contract as parse_playlist()."""
+        path = str(path)
+        try:
+            with open(path, 'rb') as fh:
+                stat = os.fstat(fh.fileno())
+                identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                state = self._state.get(path)
+
+                if state is None or state['identity'] != identity:
+                    state = self._resume(fh, stat, state) or self._full(fh)
+                    state['identity'] = identity
+                    self._state[path] = state
+        except (OSError, UnicodeDecodeError):
+            self._state.pop(path, None)
+            return [], 0
+
+        entries = state['entries']
+        return entries, max(0, len(entries) - 1)
+
+    def _full(self, fh):
+        fh.seek(0)
+        data = fh.read()
+        entries = parse_entries(data.decode().splitlines())
+        return self._state_for(data, 0, entries)
+
+    def _resume(self, fh, stat, state):
+        if state is None or not state['entries'] or state['sequence'] is None:
+            return None
+
+        head = os.pread(fh.fileno(), self.HEAD, 0)
+        sequence = _media_sequence(head)
+        if sequence is None:
+            return None
+
+        marker = state['marker']
+        entries = state['entries']
+
+        if sequence == state['sequence'] and stat.st_size > state['end']:
+            # Only new bytes, plus enough before them to prove that is what they are.
+            start = state['end'] - len(marker)
+            data = os.pread(fh.fileno(), stat.st_size - start, start)
+            if not data.startswith(marker):
+                return None
+            tail = parse_entries(_whole_lines(data[len(marker):]))
+            return self._state_for(data, start, entries + tail, sequence)
+
+        dropped = sequence - state['sequence']
+        if not 0 < dropped < len(entries):
+            return None
+
+        fh.seek(0)
+        data = fh.read()
+        at = data.rfind(marker)
+        if at < 0:
+            return None
+        tail = parse_entries(_whole_lines(data[at + len(marker):]))
+        kept = entries[dropped:] + tail
+
+        # Cheap in C, and it catches a window that changed in ways the sequence
+        # number does not show.
+        if data.count(b'#EXTINF:') != len(kept):
+            return None
+
+        return self._state_for(data, 0, kept, sequence)
+
+    def _state_for(self, data, offset, entries, sequence=None):
+        if sequence is None:
+            sequence = _media_sequence(data[:self.HEAD])
+        # Where the last entry's URI line ends, so the next read can start there.
+        marker = b''
+        end = offset + len(data)
+        if entries:
+            marker = b'\n' + entries[-1].name.encode() + b'\n'
+            at = data.rfind(marker)
+            if at >= 0:
+                end = offset + at + len(marker)
+        return {'entries': entries, 'sequence': sequence, 'marker': marker, 'end': end}
+
+
+def _whole_lines(data):
+    # A line still being written would otherwise be remembered as an entry, rather
+    # than re-read next time as it would be by a full parse.
+    return data[:data.rfind(b'\n') + 1].decode().splitlines()
+
+
+def _media_sequence(head):
+    at = head.find(b'#EXT-X-MEDIA-SEQUENCE:')
+    if at < 0:
+        return None
+    line = head[at + 22:head.find(b'\n', at)]
+    try:
+        return int(line)
+    except ValueError:
+        return None
+
+
+# Shared by every sweep, so each playlist is resumed from where the last one left it.
+playlist_follower = PlaylistFollower()
+
+
+def _format_pdt(value):
+    """The inverse, in the same form. Formatted by hand because strftime was most of
+    what indexing an entry cost."""
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%03d+0000' % (
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second, value.microsecond // 1000,
+    )
 
 
 def _parse_pdt(value):
@@ -376,6 +1099,11 @@ class Indexer:
         self.manifest = manifest
         self.dirty = set()
         self.lock = threading.Lock()
+        # (source, name) -> (hour, open file), for the latest hour each is writing.
+        # Each source's entries are only touched by its own sweeper, but the dict is
+        # shared between them all, and close_source() walks it.
+        self._handles = {}
+        self._handles_lock = threading.Lock()
 
     # The source rendition splits on the publisher's keyframes, so its segments can
     # be any length the encoder's GOP happens to be. Nothing plays this file
@@ -395,73 +1123,80 @@ class Indexer:
         return f'{ARCHIVE_PREFIX}/{source}/{hour}/{name}'
 
     def add(self, entries):
-        """Append entries not seen before. Ordering keys are assigned here, on first
-        observation, which is the only monotonic signal that involves no clock."""
+        """Append entries not seen before, and record them as indexed."""
+        namespace, rows = self.append(entries)
+        if rows:
+            self.manifest.record_indexed_many(namespace, rows)
+        return len(rows)
+
+    def append(self, entries):
+        """
+        Append entries not seen before, returning (namespace, rows) for the caller to
+        record_indexed_many() once it holds its transaction. Ordering keys are
+        assigned here, on first observation, which is the only monotonic signal that
+        involves no clock.
+        """
         if not entries:
-            return 0
+            return None, []
 
-        fresh = [
-            e for e in entries
-            if not self.manifest.already_indexed(e.source, e.session, e.n)
-        ]
+        source = entries[0].source
+        seen = self.manifest.already_indexed_many(
+            source, [(e.session, e.n) for e in entries]
+        )
+        fresh = [e for e in entries if (e.session, e.n) not in seen]
         if not fresh:
-            return 0
+            return source, []
 
-        source = fresh[0].source
+        rows = []
+        blocks = {}
         seq = self.manifest.next_seq(source, len(fresh))
-        observed = datetime.now(timezone.utc)
+        # Our own wall clock at the moment these segments were first seen complete,
+        # independent of the PDT FFmpeg derived from the publisher's timeline.
+        #
+        # PDT is anchored once at session start and then advances with the incoming
+        # stream, so it tracks the publisher's crystal rather than real time. Two
+        # independent clocks at typical +/-50ppm tolerance can separate by several
+        # seconds a day, and a con-long session never reconnects to re-anchor.
+        # Recording observed time costs ~45 bytes an entry in a file that is read
+        # once per cut, and it means the drift can be measured and corrected after
+        # the fact instead of having to be known in advance.
+        observed = f'#EXT-X-ARCHIVE-OBSERVED:{_format_pdt(datetime.now(timezone.utc))}\n'
 
-        written = 0
         for entry in fresh:
-            path = self.local_path(source, entry.hour)
-            path.parent.mkdir(parents=True, exist_ok=True)
-            if not path.exists():
-                path.write_text(self.HEADER)
-
-            with path.open('a') as fh:
-                if entry.discontinuity:
-                    fh.write('#EXT-X-DISCONTINUITY\n')
-                    fh.write(f'#EXT-X-ARCHIVE-SESSION:{entry.session}\n')
-                fh.write(f'#EXT-X-ARCHIVE-SEQ:{seq}\n')
-                # Our own wall clock at the moment this segment was first seen
-                # complete, independent of the PDT FFmpeg derived from the
-                # publisher's timeline.
-                #
-                # PDT is anchored once at session start and then advances with the
-                # incoming stream, so it tracks the publisher's crystal rather than
-                # real time. Two independent clocks at typical +/-50ppm tolerance can
-                # separate by several seconds a day, and a con-long session never
-                # reconnects to re-anchor. Recording observed time costs ~45 bytes an
-                # entry in a file that is read once per cut, and it means the drift
-                # can be measured and corrected after the fact instead of having to
-                # be known in advance.
-                fh.write(
-                    '#EXT-X-ARCHIVE-OBSERVED:'
-                    + observed.strftime('%Y-%m-%dT%H:%M:%S.')
-                    + f'{observed.microsecond // 1000:03d}+0000\n'
-                )
-                fh.write(f'#EXTINF:{entry.duration:.6f},\n')
-                fh.write(
-                    '#EXT-X-PROGRAM-DATE-TIME:'
-                    + entry.pdt.strftime('%Y-%m-%dT%H:%M:%S.')
-                    + f'{entry.pdt.microsecond // 1000:03d}+0000\n'
-                )
-                fh.write(entry.generic_name() + '\n')
-
-            self.manifest.record_indexed(source, entry.session, entry.n, seq, entry.hour)
-            with self.lock:
-                self.dirty.add((source, entry.hour, 'index.m3u8'))
+            hour = entry.hour
+            lines = blocks.setdefault(hour, [])
+            if entry.discontinuity:
+                lines.append('#EXT-X-DISCONTINUITY\n')
+                lines.append(f'#EXT-X-ARCHIVE-SESSION:{entry.session}\n')
+            lines.append(f'#EXT-X-ARCHIVE-SEQ:{seq}\n')
+            lines.append(observed)
+            lines.append(f'#EXTINF:{entry.duration:.6f},\n')
+            lines.append(f'#EXT-X-PROGRAM-DATE-TIME:{_format_pdt(entry.pdt)}\n')
+            lines.append(entry.generic_name() + '\n')
+
+            rows.append((entry.session, entry.n, seq, hour))
             seq += 1
-            written += 1
 
-        return written
+        for hour, lines in blocks.items():
+            self._append(source, hour, 'index.m3u8', self.HEADER, lines)
+
+        # Recorded after the writes: dying in between duplicates an entry on the next
+        # sweep rather than losing it.
+        return source, rows
 
     def add_source(self, entries, directory):
+        """add() for the archive-only source rendition."""
+        namespace, rows = self.append_source(entries, directory)
+        if rows:
+            self.manifest.record_indexed_many(namespace, rows)
+        return len(rows)
+
+    def append_source(self, entries, directory):
         """
-        Same job as add(), for the archive-only source rendition.
+        Same job as append(), for the archive-only source rendition.
 
-        Kept separate rather than folded into add() because the two disagree on the
-        one thing add() relies on: the ladder's renditions are cut at identical
+        Kept separate rather than folded into append() because the two disagree on
+        the one thing append() relies on: the ladder's renditions are cut at identical
         instants so a single entry with %v describes all three, while the source
         rendition is cut wherever the publisher put a keyframe. Merging them would
         mean an index entry that is right for three renditions and wrong for the
@@ -475,86 +1210,323 @@ class Indexer:
             master playlist has to advertise a BANDWIDTH for it.
         """
         if not entries:
-            return 0
+            return None, []
 
         namespace = f'{entries[0].source}#{SOURCE_RENDITION}'
 
-        fresh = [
-            e for e in entries
-            if not self.manifest.already_indexed(namespace, e.session, e.n)
-        ]
+        seen = self.manifest.already_indexed_many(
+            namespace, [(e.session, e.n) for e in entries]
+        )
+        fresh = [e for e in entries if (e.session, e.n) not in seen]
         if not fresh:
-            return 0
+            return namespace, []
 
         source = fresh[0].source
+        rows = []
+        blocks = {}
         seq = self.manifest.next_seq(namespace, len(fresh))
-        observed = datetime.now(timezone.utc)
+        observed = f'#EXT-X-ARCHIVE-OBSERVED:{_format_pdt(datetime.now(timezone.utc))}\n'
+        base = str(Path(directory))
 
-        written = 0
         for entry in fresh:
-            path = self.local_path(source, entry.hour, 'index-source.m3u8')
-            path.parent.mkdir(parents=True, exist_ok=True)
-            if not path.exists():
-                path.write_text(self.SOURCE_HEADER)
-
             try:
-                size = (Path(directory) / entry.name).stat().st_size
+                size = os.stat(f'{base}/{entry.name}').st_size
             except OSError:
                 size = 0
 
-            with path.open('a') as fh:
-                if entry.discontinuity:
-                    fh.write('#EXT-X-DISCONTINUITY\n')
-                    fh.write(f'#EXT-X-ARCHIVE-SESSION:{entry.session}\n')
-                fh.write(f'#EXT-X-ARCHIVE-SEQ:{seq}\n')
-                fh.write(
-                    '#EXT-X-ARCHIVE-OBSERVED:'
-                    + observed.strftime('%Y-%m-%dT%H:%M:%S.')
-                    + f'{observed.microsecond // 1000:03d}+0000\n'
-                )
-                if size:
-                    fh.write(f'#EXT-X-ARCHIVE-BYTES:{size}\n')
-                fh.write(f'#EXTINF:{entry.duration:.6f},\n')
-                fh.write(
-                    '#EXT-X-PROGRAM-DATE-TIME:'
-                    + entry.pdt.strftime('%Y-%m-%dT%H:%M:%S.')
-                    + f'{entry.pdt.microsecond // 1000:03d}+0000\n'
-                )
-                # Concrete name, not %v: this entry describes exactly one rendition.
-                fh.write(entry.name + '\n')
-
-            self.manifest.record_indexed(namespace, entry.session, entry.n, seq, entry.hour)
-            with self.lock:
-                self.dirty.add((source, entry.hour, 'index-source.m3u8'))
+            hour = entry.hour
+            lines = blocks.setdefault(hour, [])
+            if entry.discontinuity:
+                lines.append('#EXT-X-DISCONTINUITY\n')
+                lines.append(f'#EXT-X-ARCHIVE-SESSION:{entry.session}\n')
+            lines.append(f'#EXT-X-ARCHIVE-SEQ:{seq}\n')
+            lines.append(observed)
+            if size:
+                lines.append(f'#EXT-X-ARCHIVE-BYTES:{size}\n')
+            lines.append(f'#EXTINF:{entry.duration:.6f},\n')
+            lines.append(f'#EXT-X-PROGRAM-DATE-TIME:{_format_pdt(entry.pdt)}\n')
+            # Concrete name, not %v: this entry describes exactly one rendition.
+            lines.append(entry.name + '\n')
+
+            rows.append((entry.session, entry.n, seq, hour))
             seq += 1
-            written += 1
 
-        return written
+        for hour, lines in blocks.items():
+            self._append(source, hour, 'index-source.m3u8', self.SOURCE_HEADER, lines)
+
+        return namespace, rows
+
+    def _append(self, source, hour, name, header, lines):
+        """
+        One write per hour file per sweep, rather than an open, an exists() and a
+        handful of writes per entry. After a restart that was a 900-entry backlog's
+        worth of each, every one of them for the same one or two files.
+        """
+        fh = self._handle(source, hour, name, header)
+        try:
+            fh.write(''.join(lines))
+            fh.flush()
+            if INDEX_FSYNC:
+                os.fsync(fh.fileno())
+        finally:
+            with self._handles_lock:
+                kept = self._handles.get((source, name), (None, None))[1] is fh
+            if not kept:
+                fh.close()
+
+        with self.lock:
+            self.dirty.add((source, hour, name))
+
+    def _handle(self, source, hour, name, header):
+        """
+        The hour file open for appending. The latest hour per file is kept open, since
+        that is where every entry but a backlog's goes; an earlier hour, reached only
+        by a backlog straddling the turn of the hour, is opened for the one write.
+        """
+        with self._handles_lock:
+            current = self._handles.get((source, name))
+        if current and current[0] == hour:
+            return current[1]
+
+        path = self.local_path(source, hour, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fh = path.open('a')
+        if fh.tell() == 0:
+            fh.write(header)
+
+        if current is None or hour > current[0]:
+            if current:
+                current[1].close()
+            with self._handles_lock:
+                self._handles[(source, name)] = (hour, fh)
+        return fh
+
+    def close_source(self, source):
+        """
+        Close a source's open hour files, once its sweeper has stopped. A source
+        that comes and goes through a con would otherwise hold a descriptor per
+        file for every one it ever had.
+        """
+        with self._handles_lock:
+            gone = [self._handles.pop(key) for key in list(self._handles) if key[0] == source]
+        for _, fh in gone:
+            fh.close()
+
+    def parts_prefix(self, source, hour, name='index.m3u8'):
+        """Where an open hour's part objects go: index.m3u8 -> index.parts/."""
+        return f'{ARCHIVE_PREFIX}/{source}/{hour}/{name[:-len(".m3u8")]}.parts/'
 
     def flush(self):
-        """Push changed hour indexes to S3. The in-progress hour is re-uploaded
-        whole; it is a few tens of KB, so a delta protocol would not pay for itself."""
+        """
+        Push changed hour indexes to S3.
+
+        This used to PUT the whole hour file every flush. With OBSERVED and BYTES lines
+        an hour is well over 100 KB per source by its end, sent once a minute, so most
+        of what a flush sent was entries S3 already had. Now an open hour goes up as
+        part objects, each holding what was appended since the one before, under
+        `index.parts/<byte offset>`, zero-padded so they list in file order and
+        concatenate back to the local file. Once the hour is over (INDEX_CLOSE_GRACE)
+        the file is PUT whole as index.m3u8, once, and its parts are deleted.
+        ArchivePlaylistService reads either form.
+
+        A reader has to fetch every part, so parts are merged as they accumulate, the
+        way a binary counter carries: a new part spanning as many flushes as the one
+        before it is folded into that one and sent as a single part from the earlier
+        offset. An hour of 60 flushes is then at most 5 parts, and each entry is sent
+        about log2(60) times rather than up to 60.
+
+        A merged part overwrites the first of those it replaces and the others are
+        deleted after, so a reader listing in between can see parts that overlap, or
+        one that has gone. The reader skips bytes it already has from an earlier
+        offset and gives up only on a gap, which makes every state in between safe.
+        """
         with self.lock:
-            pending = list(self.dirty)
+            pending = set(self.dirty)
             self.dirty.clear()
+        # An hour that closed while the uploader was down still has parts to compact,
+        # though nothing has been appended to it since.
+        pending.update(self.manifest.chunked_indexes())
 
-        for source, hour, name in pending:
-            path = self.local_path(source, hour, name)
-            if not path.exists():
-                continue
+        for source, hour, name in sorted(pending):
             try:
-                s3.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=self.s3_key(source, hour, name),
-                    Body=path.read_bytes(),
-                    ContentType='application/vnd.apple.mpegurl',
-                )
-            except ClientError as exc:
-                logger.error('Index upload failed for %s/%s/%s: %s', source, hour, name, exc)
-                # Put it back so the next flush retries.
+                if hour_closed(hour):
+                    self._compact(source, hour, name)
+                else:
+                    self._put_part(source, hour, name)
+            except Exception as exc:
+                # Whatever it was, put it back so the next flush retries: it was taken
+                # out of `dirty` above, and nothing else would send it again.
+                log = logger.error if isinstance(exc, S3_ERRORS) else logger.exception
+                log('Index upload failed for %s/%s/%s: %s', source, hour, name, exc)
                 with self.lock:
                     self.dirty.add((source, hour, name))
 
+    def _put_part(self, source, hour, name):
+        path = self.local_path(source, hour, name)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+
+        parts = self.manifest.index_parts(source, hour, name)
+        end = parts[-1][0] + parts[-1][1] if parts else 0
+        if size < end:
+            # Shorter than what S3 already has, so the local file was lost and
+            # rebuilt since. The parts describe a different file; start them over.
+            logger.warning('Index %s/%s/%s is shorter than its parts; resending', source, hour, name)
+            self._delete_parts(source, hour, name)
+            parts, end = [], 0
+        if size == end:
+            return
+
+        start, flushes, superseded = end, 1, []
+        while parts and parts[-1][2] <= flushes:
+            start, _, merged = parts.pop()
+            flushes += merged
+            superseded.append(start)
+
+        with path.open('rb') as fh:
+            fh.seek(start)
+            body = fh.read(size - start)
+        # A sweep may be appending right now. Stop at the last complete line, so no
+        # part ever ends in half an entry that a reader would take for a whole one.
+        body = body[:body.rfind(b'\n') + 1]
+        if start + len(body) <= end:
+            return
+
+        prefix = self.parts_prefix(source, hour, name)
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=f'{prefix}{start:012d}',
+            Body=body,
+            ContentType='application/vnd.apple.mpegurl',
+        )
+        gone = [{'Key': f'{prefix}{offset:012d}'} for offset in superseded if offset != start]
+        if gone:
+            s3.delete_objects(Bucket=S3_BUCKET, Delete={'Objects': gone, 'Quiet': True})
+        self.manifest.record_index_part(source, hour, name, start, len(body), flushes)
+
+    def _compact(self, source, hour, name):
+        """The closed hour as the one index.m3u8, gzipped, and its sidecar, then its
+        parts gone. Also where an append to an hour already compacted lands: the whole
+        file again."""
+        path = self.local_path(source, hour, name)
+        if not path.exists():
+            # Lost locally; the parts are the only copy left, and readable as they are.
+            return
+        body, encoding = path.read_bytes(), {}
+        try:
+            self._put_sidecar(source, hour, name, body)
+        except (ValueError, struct.error) as exc:
+            # An entry it cannot parse would fail every retry the same way. The hour
+            # is compacted without one; readers parse the whole index instead.
+            logger.error('No sidecar for %s/%s/%s: %s', source, hour, name, exc)
+        if INDEX_GZIP:
+            # mtime=0 so the same index always compresses to the same bytes, and ETag.
+            body, encoding = gzip.compress(body, mtime=0), {'ContentEncoding': 'gzip'}
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=self.s3_key(source, hour, name),
+            Body=body,
+            ContentType='application/vnd.apple.mpegurl',
+            **encoding,
+        )
+        if self.manifest.index_parts(source, hour, name):
+            self._delete_parts(source, hour, name)
+
+    def _put_sidecar(self, source, hour, name, index):
+        """
+        The hour's sidecar (see build_sidecar), written next to the local index and
+        uploaded next to the S3 one, as index.idx or index-source.idx. Built from the
+        finished playlist rather than kept up entry by entry, so the two cannot
+        disagree, and left uncompressed, since it is read with ranged GETs.
+
+        Only _compact() writes one, so an open hour, and a closed one still inside
+        INDEX_CLOSE_GRACE, has no sidecar and a range over it fetches the whole index
+        (see segments_between in scripts/archive_index.py). Keeping it up on every
+        flush would mean re-PUTting the whole sidecar each time, the cost the part
+        objects exist to avoid.
+        """
+        sidecar = name[:-len('.m3u8')] + '.idx'
+        body = build_sidecar(index.decode())
+        self.local_path(source, hour, sidecar).write_bytes(body)
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=self.s3_key(source, hour, sidecar),
+            Body=body,
+            ContentType='application/octet-stream',
+        )
+
+    def _delete_parts(self, source, hour, name):
+        """Every part object under the hour's prefix, listed rather than taken from the
+        manifest: dying between a merge and its bookkeeping can leave one unrecorded."""
+        paginator = s3.get_paginator('list_objects_v2')
+        keys = [
+            {'Key': obj['Key']}
+            for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=self.parts_prefix(source, hour, name))
+            for obj in page.get('Contents', [])
+        ]
+        for i in range(0, len(keys), 1000):
+            s3.delete_objects(Bucket=S3_BUCKET, Delete={'Objects': keys[i:i + 1000], 'Quiet': True})
+        self.manifest.end_index_parts(source, hour, name)
+
+
+# A closed hour's index, as fixed-width little-endian records behind an 8-byte header
+# (magic, version, record size), sorted by PDT: PDT and observed time in ms since
+# the epoch, seq, duration in us, session, n. 40 bytes an entry where the playlist
+# takes ~180, and record i sits at a known offset, so a reader resolves a time range
+# by bisecting with ranged GETs instead of downloading and parsing the hour.
+SIDECAR_MAGIC = b'AIDX'
+SIDECAR_VERSION = 1
+SIDECAR_HEADER = struct.Struct('<4sHH')
+SIDECAR_RECORD = struct.Struct('<qqqIqI')
+
+
+def build_sidecar(index):
+    """
+    The sidecar for an hour index's text.
+
+    Sorted by PDT, stably, because bisecting needs it and the playlist only nearly
+    is: it is in observation order, and a publisher whose clock is set back between
+    sessions starts the next one earlier than the last ended.
+    """
+    records = []
+    seq = observed = duration = pdt = None
+    for line in index.splitlines():
+        if line.startswith('#EXT-X-ARCHIVE-SEQ:'):
+            seq = int(line[19:])
+        elif line.startswith('#EXT-X-ARCHIVE-OBSERVED:'):
+            observed = _parse_pdt(line[24:])
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[8:].split(',')[0])
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            pdt = _parse_pdt(line[25:])
+        elif line and not line.startswith('#'):
+            # prime_%v_1785710235_000042.ts -> (1785710235, 42)
+            _, session, n = line[:-3].rsplit('_', 2)
+            if pdt is not None and duration is not None:
+                records.append((
+                    round(pdt.timestamp() * 1000),
+                    round(observed.timestamp() * 1000) if observed else 0,
+                    seq if seq is not None else len(records),
+                    round(duration * 1_000_000),
+                    int(session) if session.isdigit() else 0,
+                    int(n),
+                ))
+            seq = observed = duration = pdt = None
+
+    records.sort(key=lambda record: record[0])
+    body = bytearray(SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, SIDECAR_RECORD.size))
+    for record in records:
+        body += SIDECAR_RECORD.pack(*record)
+    return bytes(body)
+
+
+def hour_closed(hour):
+    """Whether a `YYYYMMDD/HH` bucket ended more than INDEX_CLOSE_GRACE ago."""
+    began = datetime.strptime(hour, '%Y%m%d/%H').replace(tzinfo=timezone.utc)
+    return time.time() >= began.timestamp() + 3600 + INDEX_CLOSE_GRACE
+
 
 def assert_renditions_aligned(source, canonical_entries, playlists):
     """
@@ -579,212 +1551,971 @@ def assert_renditions_aligned(source, canonical_entries, playlists):
 
 # --------------------------------------------------------------------- uploading
 
-class RateLimitedReader:
+class SegmentBody:
     """
-    Token bucket over the read side of an upload.
+    An upload body over a mapped segment, or one part of it. Throttles and counts
+    the read side of the upload against its lane's share.
 
     The origin uploads roughly 1.4 MB/s per source continuously while also feeding
     the edge, so unbounded archive traffic competes with viewers for the same uplink.
     boto3 takes any file-like object, so throttling reads throttles the transfer.
+
+    Reads hand out slices of the mapping rather than copies of it. This replaced a
+    reader over the open file, which cost a copy out of the page cache for every
+    block the HTTP layer asked for, on top of the pass segment_digest had already
+    made over the same bytes. Now the digest, botocore's payload hash (plain-HTTP
+    endpoints only) and the socket writes all read the page cache in place.
     """
 
-    def __init__(self, fh, rate_bytes_per_sec):
-        self.fh = fh
-        self.rate = rate_bytes_per_sec
+    def __init__(self, view, lane):
+        self.view = view
+        self.lane = lane
+        self.position = 0
+
+    def __len__(self):
+        return len(self.view)
 
     def read(self, size=-1):
-        chunk = self.fh.read(size)
-        if chunk and self.rate > 0:
-            self._consume(len(chunk))
+        end = len(self.view)
+        if size is not None and size >= 0:
+            end = min(end, self.position + size)
+        chunk = self.view[self.position:end]
+        self.position = end
+        if chunk:
+            upload_limiter.consume(self.lane, len(chunk))
         return chunk
 
-    def _consume(self, count):
-        with rate_limiter_lock:
-            now = time.monotonic()
-            elapsed = now - _rate_tokens['at']
-            _rate_tokens['at'] = now
-            _rate_tokens['bytes'] = max(0.0, _rate_tokens['bytes'] - elapsed * self.rate)
-            _rate_tokens['bytes'] += count
-            over = _rate_tokens['bytes'] - self.rate  # allow one second of burst
-            delay = over / self.rate if over > 0 else 0
-        if delay > 0:
-            time.sleep(min(delay, 5))
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
 
-    def __getattr__(self, name):
-        return getattr(self.fh, name)
+    def tell(self):
+        return self.position
 
 
-def upload_segment(manifest, path, key):
-    """Upload then confirm. Only a confirmed copy makes a segment reapable."""
-    with upload_semaphore:
-        try:
-            local = Path(path)
-            if not local.exists():
-                # Reaped or removed underneath us; nothing to do.
-                manifest.forget(path)
-                return
+def map_segment(path):
+    """
+    A read-only memoryview of the file, mapped rather than read. Release it with
+    unmap(). Empty files cannot be mapped; callers skip those before getting here.
 
-            size = local.stat().st_size
-            if size == 0:
-                return
+    Segments are never rewritten once closed, only unlinked, and the mapping keeps
+    an unlinked file readable, so the reaper removing one mid-upload is harmless.
+    """
+    with open(path, 'rb') as fh:
+        mapping = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, 'MADV_WILLNEED'):
+        # A backlog after a restart may have left the page cache; start reading it
+        # in now rather than a page fault at a time.
+        mapping.madvise(mmap.MADV_WILLNEED)
+    return memoryview(mapping)
+
+
+def unmap(view):
+    mapping = view.obj
+    view.release()
+    try:
+        mapping.close()
+    except BufferError:
+        # A slice handed to the HTTP layer is still referenced, by the traceback
+        # of a failed request most likely. The mapping goes when that does.
+        pass
 
-            rate = MAX_UPLOAD_RATE_MBPS * 1_000_000 / 8
-            with local.open('rb') as fh:
-                body = RateLimitedReader(fh, rate) if rate > 0 else fh
-                s3.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=key,
-                    Body=body,
-                    ContentType='video/mp2t',
-                )
 
-            head = s3.head_object(Bucket=S3_BUCKET, Key=key)
-            if head['ContentLength'] != size:
-                logger.error(
-                    'Size mismatch for %s: local %d, remote %d. Not marking verified.',
-                    key, size, head['ContentLength'],
-                )
-                with metrics_lock:
-                    metrics['failed'] += 1
-                return
+@contextmanager
+def mapped(path):
+    view = map_segment(path)
+    try:
+        yield view
+    finally:
+        unmap(view)
 
-            manifest.record_verified(path, size, head.get('ETag', '').strip('"'))
-            with metrics_lock:
-                metrics['uploaded'] += 1
-                metrics['verified'] += 1
 
-        except ClientError as exc:
-            logger.error('Upload failed for %s: %s', key, exc)
-            with metrics_lock:
-                metrics['failed'] += 1
-        except OSError as exc:
-            logger.error('Read failed for %s: %s', path, exc)
-            with metrics_lock:
-                metrics['failed'] += 1
+class _Lane:
+    """One source's ladder, or its source archive: a token bucket of its own."""
 
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.lock = threading.Lock()
+        self.debt = 0.0
+        self.at = time.monotonic()
+        self.active_until = 0.0
+        self.sent = 0
 
-# ------------------------------------------------------------------------ reaper
 
-def reap(manifest):
+class FairShareLimiter:
     """
-    Delete local segments that S3 has confirmed and that have left the rewind window.
+    MAX_UPLOAD_RATE_MBPS, divided between sources by weight.
 
-    Both conditions are required. Verification alone is not enough: the segments
-    inside the window are what makes live rewind work, and they are also what the
-    transcoder's session-collision check reads. Age alone is obviously not enough.
-    """
-    now = time.time()
-    freed = 0
+    This replaced one token bucket behind one lock, shared by every upload thread.
+    That capped the total, but every read of every upload queued on the same lock,
+    and it had no notion of whose bytes they were: a source with a high-bitrate
+    contribution queued more of them and so got more of the link.
 
-    for path, key, size in manifest.reapable():
-        local = Path(path)
-        if not local.exists():
-            manifest.forget(path)
-            continue
+    Each lane keeps its own bucket, behind its own lock, filling at
 
-        try:
-            age = now - local.stat().st_mtime
-        except OSError:
-            continue
+        cap * lane weight / total weight of the lanes uploading right now
 
-        if age < DVR_WINDOW_SECONDS:
-            continue
+    so uploads only contend with others in the same lane. A lane counts as uploading
+    for ACTIVE_GRACE after its last read. A lane that goes quiet drops out of the
+    total within that, and what it was not using is divided among the rest - which
+    is the borrowing - and it takes its share back the moment it reads again.
 
-        # Re-confirm against S3 rather than trusting the manifest alone; a bucket
-        # lifecycle rule or an out-of-band delete would otherwise go unnoticed.
-        try:
-            head = s3.head_object(Bucket=S3_BUCKET, Key=key)
-        except ClientError:
-            logger.warning('Not in S3 at reap time, keeping local copy: %s', key)
-            continue
+    The shares of the active lanes add up to the cap, so the total holds without
+    anything global being locked: the active weight is recomputed at most every
+    REWEIGH seconds by whichever reader finds it stale, from plain attribute reads.
+    Each lane may run one second of its own share ahead, as the single bucket did.
 
-        if size is not None and head['ContentLength'] != size:
-            logger.warning('Size drift at reap time, keeping local copy: %s', key)
-            continue
+    With no cap the limiter still counts, so throughput is reported either way.
+    """
 
-        try:
-            local.unlink()
-            manifest.forget(path)
-            freed += 1
-        except OSError as exc:
-            logger.error('Could not delete %s: %s', path, exc)
+    ACTIVE_GRACE = 2.0
+    REWEIGH = 0.25
 
-    if freed:
-        with metrics_lock:
-            metrics['reaped'] += freed
-        logger.info('Reaped %d verified segment(s) past the %ds window',
-                    freed, DVR_WINDOW_SECONDS)
+    def __init__(self, rate_bytes_per_sec):
+        self.rate = rate_bytes_per_sec
+        self._lanes = {}
+        self._lanes_lock = threading.Lock()
+        self._active = (1.0, 0.0)
+
+    def lane(self, name, weight):
+        lane = self._lanes.get(name)
+        if lane is None:
+            with self._lanes_lock:
+                lane = self._lanes.setdefault(name, _Lane(name, weight))
+        return lane
+
+    def consume(self, lane, count):
+        delay = self.reserve(lane, count)
+        if delay > 0:
+            time.sleep(delay)
 
+    def reserve(self, lane, count, most=5):
+        """
+        Account for `count` bytes, returning how long to wait before sending them.
+        consume() sleeps it off, a read at a time, and no single sleep runs past
+        `most` seconds.
+
+        The async engine awaits the wait instead, and passes most=None: it reserves
+        a whole segment before sending any of it, so with every upload in flight
+        reserving at once, a bounded wait let each of them send its segment after at
+        most `most` seconds whatever the cap, and the total ran several times over it.
+        """
+        now = time.monotonic()
+        lane.active_until = now + self.ACTIVE_GRACE
+        if self.rate <= 0:
+            with lane.lock:
+                lane.sent += count
+            return 0
 
-# -------------------------------------------------------------------- main sweep
+        share = self.rate * lane.weight / self._active_weight(now, lane)
+        with lane.lock:
+            lane.sent += count
+            lane.debt = max(0.0, lane.debt - (now - lane.at) * share) + count
+            lane.at = now
+            over = lane.debt - share  # allow one second of burst
+        if over <= 0:
+            return 0
+        return over / share if most is None else min(over / share, most)
 
-def sweep(manifest, indexer):
-    """One reconciling pass: parse playlists, index and enqueue what is complete."""
-    for source in discover_sources():
-        playlists = {}
-        for rendition in RENDITIONS:
-            path = Path(HLS_PATH) / f'{source}_{rendition}.m3u8'
-            if path.exists():
-                entries, complete = parse_playlist(path)
-                playlists[rendition] = entries[:complete]
-
-        canonical = playlists.get(CANONICAL_RENDITION)
-        if not canonical:
-            continue
+    def _active_weight(self, now, lane):
+        weight, at = self._active
+        if now - at > self.REWEIGH:
+            weight = sum(
+                l.weight for l in list(self._lanes.values()) if l.active_until > now
+            )
+            self._active = (weight, now)
+        # A lane that has just woken may not be in the cached total yet.
+        return max(weight, lane.weight)
 
-        assert_renditions_aligned(source, canonical, playlists)
+    def throughput(self):
+        """Bytes sent per lane since the previous call."""
+        sent = {}
+        for lane in list(self._lanes.values()):
+            with lane.lock:
+                if lane.sent:
+                    sent[lane.name] = lane.sent
+                    lane.sent = 0
+        return sent
 
-        written = indexer.add(canonical)
-        if written:
-            with metrics_lock:
-                metrics['indexed'] += written
 
-        # Every rendition's bytes still have to be uploaded individually, even though
-        # one index entry covers all of them.
-        for rendition, entries in playlists.items():
-            for entry in entries:
-                path = Path(HLS_PATH) / entry.name
-                if manifest.known(path):
-                    continue
-                key = f'{ARCHIVE_PREFIX}/{source}/{entry.hour}/{entry.name}'
-                manifest.record_pending(path, key, source)
+upload_limiter = FairShareLimiter(MAX_UPLOAD_RATE_MBPS * 1_000_000 / 8)
+
+
+def upload_lane(path):
+    """The limiter lane a segment's bytes are counted against, from its file name."""
+    source, rendition = segment_labels(path)
+    weight = UPLOAD_SHARES.get(source, 1.0)
+    if rendition == SOURCE_RENDITION:
+        return upload_limiter.lane(f'{source}#{SOURCE_RENDITION}', weight * SOURCE_ARCHIVE_SHARE)
+    return upload_limiter.lane(source, weight)
+
+
+def upload_segment(manifest, path, key):
+    """Upload then confirm. Only a confirmed copy makes a segment reapable."""
+    try:
+        local = Path(path)
+        if not local.exists():
+            # Reaped or removed underneath us; nothing to do.
+            abort_multipart(manifest, path, key)
+            manifest.forget(path)
+            return
+
+        size = local.stat().st_size
+        if size == 0:
+            return
+
+        began = time.perf_counter()
+        if size >= MULTIPART_THRESHOLD:
+            etag = put_multipart(manifest, local, key, size)
+        else:
+            etag = put_single(local, key, size)
+        record_upload(manifest, path, size, etag, began)
+
+    except S3_ERRORS as exc:
+        logger.error('Upload failed for %s: %s', key, exc)
+        with metrics_lock:
+            metrics['failed'] += 1
+    except OSError as exc:
+        logger.error('Read failed for %s: %s', path, exc)
+        with metrics_lock:
+            metrics['failed'] += 1
+
+
+def record_upload(manifest, path, size, etag, began):
+    """Book a finished upload: verified in the manifest if `etag` confirmed it."""
+    if etag is None:
+        with metrics_lock:
+            metrics['failed'] += 1
+        return
+
+    upload_rate.observe(size / (time.perf_counter() - began), *segment_labels(path))
+    backlog.uploaded(segment_labels(path)[0], size)
+    manifest.record_verified(path, size, etag)
+    with metrics_lock:
+        metrics['uploaded'] += 1
+        metrics['verified'] += 1
+
+
+def put_single(local, key, size):
+    """One PUT. Returns the confirmed ETag, or None if S3 holds something else."""
+    with mapped(local) as view:
+        # The digest has to be in the request headers, ahead of the body, so it
+        # takes a pass over the file first. A segment that has just been closed
+        # is still in the page cache, which makes that pass a memory read.
+        digest, proof = segment_digest(view)
+
+        with s3_seconds.time('put', *segment_labels(local)):
+            response = s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=key,
+                Body=SegmentBody(view, upload_lane(local)),
+                ContentType='video/mp2t',
+                **proof,
+            )
+
+    if confirmed_by_put(response, digest):
+        return response.get('ETag', '').strip('"')
+    return confirm_by_head(key, size)
+
+
+def put_multipart(manifest, local, key, size):
+    """
+    A large segment as parallel ranged parts. Returns the confirmed ETag, or None.
+
+    A single PUT of a many-MB segment retries the whole body on any failure, and a
+    crash throws away whatever had been sent. Here each part is its own request,
+    checked by S3 against its Content-MD5, and recorded in the manifest as soon as
+    it is acknowledged, so the next attempt - after a failed part or a restart -
+    sends only the parts that are missing.
+
+    The completed object's ETag is the MD5 of the parts' MD5s, suffixed with the
+    part count, which is computable from the parts' own ETags; a match proves the
+    object is exactly those parts, without a HEAD.
+    """
+    path = str(local)
+    state = manifest.multipart(path)
+    if state is None:
+        upload_id = s3.create_multipart_upload(
+            Bucket=S3_BUCKET, Key=key, ContentType='video/mp2t'
+        )['UploadId']
+        part_size, done = MULTIPART_PART_SIZE, {}
+        manifest.begin_multipart(path, upload_id, part_size)
+    else:
+        # Resumed with the part size it was begun with, whatever the setting is now.
+        upload_id, part_size, done = state
+        logger.info('Resuming multipart upload of %s: %d part(s) already sent', key, len(done))
+
+    count = -(-size // part_size)
+    missing = [n for n in range(1, count + 1) if n not in done]
+    failure = None
+
+    with mapped(local) as view, ThreadPoolExecutor(max_workers=MULTIPART_CONCURRENCY) as pool:
+        futures = {
+            pool.submit(put_part, local, view, key, upload_id, n, part_size): n
+            for n in missing
+        }
+        for future in as_completed(futures):
+            try:
+                etag = future.result()
+            except (*S3_ERRORS, OSError) as exc:
+                failure = failure or exc
+                continue
+            manifest.record_part(path, futures[future], etag)
+            done[futures[future]] = etag
+
+    if failure is not None:
+        if _error_code(failure) == 'NoSuchUpload':
+            # Aborted under us, by a lifecycle rule or by hand. Start over next time.
+            manifest.end_multipart(path)
+        raise failure
+
+    with s3_seconds.time('complete_multipart', *segment_labels(key)):
+        response = s3.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': n, 'ETag': f'"{done[n]}"'} for n in range(1, count + 1)
+            ]},
+        )
+    manifest.end_multipart(path)
+
+    etag = response.get('ETag', '').strip('"')
+    if UPLOAD_VERIFY != 'head' and etag == multipart_etag(done[n] for n in range(1, count + 1)):
+        return etag
+    return confirm_by_head(key, size)
+
+
+def put_part(local, view, key, upload_id, number, part_size):
+    """Part `number` (from 1) of the mapped file, as a slice of it. Returns its ETag."""
+    offset = (number - 1) * part_size
+    data = view[offset:offset + part_size]
+
+    with s3_seconds.time('upload_part', *segment_labels(local)):
+        response = s3.upload_part(
+            Bucket=S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=SegmentBody(data, upload_lane(local)),
+            ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+        )
+    return response['ETag'].strip('"')
+
+
+def multipart_etag(part_etags):
+    """What S3 reports for a completed multipart object, or None if a part's ETag is
+    not a plain MD5 (SSE-KMS), in which case there is nothing to compare against."""
+    try:
+        digests = [bytes.fromhex(etag) for etag in part_etags]
+    except ValueError:
+        return None
+    return f'{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}'
+
+
+def abort_multipart(manifest, path, key):
+    """Drop an unfinished multipart upload, so S3 does not keep its parts forever."""
+    state = manifest.multipart(path)
+    if state is None:
+        return
+    try:
+        s3.abort_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=state[0])
+    except S3_ERRORS as exc:
+        if _error_code(exc) != 'NoSuchUpload':
+            logger.warning('Could not abort multipart upload of %s: %s', key, exc)
+            return
+    manifest.end_multipart(path)
+
+
+def _error_code(exc):
+    return getattr(exc, 'response', {}).get('Error', {}).get('Code')
+
+
+def confirm_by_head(key, size):
+    """The fallback proof: ask S3 what it holds. Returns its ETag, or None."""
+    with s3_seconds.time('head', *segment_labels(key)):
+        head = s3.head_object(Bucket=S3_BUCKET, Key=key)
+    if head['ContentLength'] != size:
+        logger.error(
+            'Size mismatch for %s: local %d, remote %d. Not marking verified.',
+            key, size, head['ContentLength'],
+        )
+        return None
+    return head.get('ETag', '').strip('"')
 
-        sweep_source(manifest, indexer, source)
+
+def segment_digest(data):
+    """The digest UPLOAD_VERIFY calls for, over a mapped or read segment, and the
+    put_object arguments carrying it."""
+    if UPLOAD_VERIFY not in ('md5', 'sha256'):
+        return None, {}
+    return _proof(hashlib.new(UPLOAD_VERIFY, data).digest())
+
+
+def _proof(digest):
+    encoded = base64.b64encode(digest).decode()
+    if UPLOAD_VERIFY == 'md5':
+        return digest, {'ContentMD5': encoded}
+    return digest, {'ChecksumSHA256': encoded}
+
+
+def confirmed_by_put(response, digest):
+    """Whether the PUT response alone proves S3 stored exactly what was sent."""
+    if digest is None:
+        return False
+    if UPLOAD_VERIFY == 'md5':
+        return response.get('ETag', '').strip('"') == digest.hex()
+    return response.get('ChecksumSHA256') == base64.b64encode(digest).decode()
+
+
+# ------------------------------------------------------------------------ reaper
+
+def reap(manifest):
+    """
+    Delete local segments that S3 has confirmed and that have left the rewind window.
+
+    Both conditions are required. Verification alone is not enough: the segments
+    inside the window are what makes live rewind work, and they are also what the
+    transcoder's session-collision check reads. Age alone is obviously not enough.
+
+    Age comes from the manifest's captured_at rather than a stat per file, so the
+    reaper only ever sees segments it can delete, oldest first.
+    """
+    window = disk_watchdog.window()
+    candidates = manifest.reapable(time.time() - window)
+    if not candidates:
+        return
+
+    # Re-confirm against S3 rather than trusting the manifest alone; a bucket
+    # lifecycle rule or an out-of-band delete would otherwise go unnoticed.
+    stored = listed_sizes(key for _, key, _ in candidates)
+    freed = 0
+
+    for path, key, size in candidates:
+        if key not in stored or (size is not None and stored[key] != size):
+            if not os.path.exists(path):
+                # Nothing left to protect.
+                manifest.forget(path)
+            elif key not in stored:
+                logger.warning('Not in S3 at reap time, keeping local copy: %s', key)
+            else:
+                logger.warning('Size drift at reap time, keeping local copy: %s', key)
+            continue
+
+        try:
+            os.unlink(path)
+            freed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.error('Could not delete %s: %s', path, exc)
+            continue
+        manifest.forget(path)
+
+    if freed:
+        with metrics_lock:
+            metrics['reaped'] += freed
+        logger.info('Reaped %d verified segment(s) past the %ds window',
+                    freed, window)
+
+
+def reap_loop(manifest):
+    """
+    reap() every REAP_INTERVAL, and every DISK_CHECK_INTERVAL while the disk is short.
+
+    The watchdog is checked on the shorter interval throughout, because at 15% free
+    a few hundred Mbps of backlog is minutes from the next step, not hours. The
+    scanned metrics gauges are refreshed alongside it.
+    """
+    last = 0.0
+    while True:
+        try:
+            if METRICS_PORT:
+                scanned.refresh(manifest)
+        except Exception:
+            logger.exception('Refreshing scanned gauges failed')
+        time.sleep(DISK_CHECK_INTERVAL)
+        try:
+            pressed = disk_watchdog.update()
+            due = time.monotonic() - last >= REAP_INTERVAL
+            if pressed or due:
+                last = time.monotonic()
+                reap(manifest)
+            if due and disk_watchdog.exhausted():
+                logger.error(
+                    'HLS volume still at %.1f%% free with the rewind window at its '
+                    '%ds floor. %d segment(s) are not yet in S3 and will not be '
+                    'deleted; only uploads catching up can free more.',
+                    disk_watchdog.free_percent, disk_watchdog.window(),
+                    manifest.pending_count(),
+                )
+        except Exception:
+            logger.exception('Reap failed')
+
+
+class DiskWatchdog:
+    """
+    The local rewind window, shortened in steps while the HLS volume is short of space.
+
+    With S3 slow or unreachable, verified segments stop arriving and everything
+    accumulates; the disk filling would take the live stream down with it. Giving
+    up rewind first keeps the origin serving. Only the window moves - reap() still
+    refuses anything unconfirmed - so under a full outage this buys nothing, and
+    the floor step alerts instead.
+    """
+
+    def __init__(self, steps, floor, hysteresis):
+        self.steps = steps
+        self.floor = floor
+        self.hysteresis = hysteresis
+        self.level = 0
+        self.free_percent = None
+
+    def update(self):
+        """Re-read free space. True while any step is in effect."""
+        space = disk_space(HLS_PATH)
+        if space is None:
+            return self.level > 0
+        free, total = space
+        self.free_percent = percent = 100 * free / total if total else 100.0
+
+        level = self.level
+        while level < len(self.steps) and percent < self.steps[level][0]:
+            level += 1
+        while level > 0 and percent > self.steps[level - 1][0] + self.hysteresis:
+            level -= 1
+
+        if level > self.level:
+            log = logger.error if level == len(self.steps) else logger.warning
+            log('HLS volume at %.1f%% free: rewind window reduced to %ds',
+                percent, self._window(level))
+        elif level < self.level:
+            logger.info('HLS volume back to %.1f%% free: rewind window raised to %ds',
+                        percent, self._window(level))
+        self.level = level
+        return level > 0
+
+    def window(self):
+        return self._window(self.level)
+
+    def exhausted(self):
+        return self.level == len(self.steps) and self.level > 0
+
+    def _window(self, level):
+        if level == 0:
+            return DVR_WINDOW_SECONDS
+        return max(self.floor, int(DVR_WINDOW_SECONDS * self.steps[level - 1][1]))
+
+
+disk_watchdog = DiskWatchdog(
+    DISK_PRESSURE_STEPS, DVR_WINDOW_FLOOR_SECONDS, DISK_PRESSURE_HYSTERESIS
+)
+
+
+def disk_space(path):
+    """(free, total) bytes on the volume holding `path`, or None."""
+    try:
+        stat = os.statvfs(path)
+    except OSError:
+        return None
+    return stat.f_bavail * stat.f_frsize, stat.f_blocks * stat.f_frsize
+
+
+def listed_sizes(keys):
+    """
+    What S3 holds of `keys`, as {key: size}, from one listing per hour prefix.
+
+    A pass can re-confirm thousands of segments, and a HEAD each was thousands of
+    requests every REAP_INTERVAL. Keys are bucketed by hour, so a listing of the
+    prefix answers a thousand of them per call. The listing starts just before the
+    lowest key wanted and stops once past the highest, so a prefix whose early
+    segments were reaped on earlier passes is not re-read from its beginning.
+
+    A prefix that cannot be listed contributes nothing, which keeps every local copy
+    under it: absence here only ever means "do not delete".
+    """
+    wanted = {}
+    for key in keys:
+        wanted.setdefault(key.rsplit('/', 1)[0] + '/', set()).add(key)
+
+    sizes = {}
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for prefix, batch in wanted.items():
+        # StartAfter is exclusive; anything between this and the first key is
+        # simply listed and ignored.
+        start, last = min(batch)[:-1], max(batch)
+        try:
+            for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix, StartAfter=start):
+                contents = page.get('Contents', [])
+                for obj in contents:
+                    if obj['Key'] in batch:
+                        sizes[obj['Key']] = obj['Size']
+                if not contents or contents[-1]['Key'] >= last:
+                    break
+        except ClientError as exc:
+            logger.warning('Could not list %s at reap time, keeping its local copies: %s',
+                           prefix, exc)
+            for key in batch:
+                sizes.pop(key, None)
+
+    return sizes
+
+
+# -------------------------------------------------------------------- main sweep
+
+def sweep(manifest, indexer):
+    """
+    One reconciling pass over every source in turn, then uploads dispatched.
+
+    main() no longer runs this - each source has a SourceSweeper - but it is the
+    same pass, source by source, which is what the bench and a one-off run want.
+    """
+    for source in discover_sources():
+        sweep_one(manifest, indexer, source)
 
     dispatch_uploads(manifest)
 
 
-def sweep_source(manifest, indexer, source):
+def sweep_one(manifest, indexer, source):
+    """Parse one source's playlists, index and enqueue what is complete."""
+    with sweep_seconds.time(source):
+        indexed, pending = sweep_ladder(indexer, source)
+        source_indexed, source_pending = sweep_source(indexer, source)
+
+        # One transaction per source rather than one per segment, and only around
+        # the writes. The playlist reads, stats and index appends above run outside
+        # it: the write lock is the whole manifest's, and held through a slow disk
+        # it would stall every other sweeper and the upload workers behind it.
+        with manifest.batch():
+            for namespace, rows in (indexed, source_indexed):
+                if rows:
+                    manifest.record_indexed_many(namespace, rows)
+            if pending or source_pending:
+                manifest.record_pending_many(pending + source_pending)
+
+
+class SourceSweeper:
+    """
+    One source's sweep, on its own thread and its own schedule.
+
+    A single loop over every source meant the slowest of them set everyone's
+    cadence: one with a restart backlog, a playlist on a slow disk or a manifest
+    write stuck behind a lock held up indexing for all the others, and an entry
+    that is not indexed before it slides out of the live playlist is never
+    indexed at all. Here a source only ever waits for itself.
+
+    Each sweeps every `interval`, or as soon as poke()d. A sweep that raises is
+    logged and retried with backoff, doubling up to FAILED_SWEEP_MAX, instead of
+    taking the pass down for the other sources. Nothing is shared but the
+    manifest - per-thread connections, per-source rows - the indexer's per-source
+    files, and the upload pool, which is told there is work via the dispatcher.
+    """
+
+    FAILED_SWEEP_MAX = 60
+    # How long main() waits for a stopped sweeper whose source has reappeared,
+    # before leaving the source to its next pass.
+    JOIN_TIMEOUT = 2
+
+    def __init__(self, source, manifest, indexer, interval):
+        self.source = source
+        self.manifest = manifest
+        self.indexer = indexer
+        self.interval = interval
+        self.failures = 0
+        self.duration = None
+        self.swept_at = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._wake.set()
+        self._thread = threading.Thread(
+            target=self._run, name=f'sweep-{self.source}', daemon=True
+        )
+        self._thread.start()
+
+    def poke(self):
+        self._wake.set()
+
+    def stop(self):
+        """Ask the thread to finish. A sweep under way runs to its end first."""
+        self._stopped = True
+        self._wake.set()
+
+    def join(self, timeout):
+        """Wait up to `timeout` for a stop()ped thread. True once it has exited."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # Only this thread appends to the source's files, so once it is done
+            # they can be closed without racing a write.
+            self.indexer.close_source(self.source)
+
+    def _loop(self):
+        while True:
+            delay = self.interval
+            if self.failures:
+                delay = min(self.interval * 2 ** self.failures, self.FAILED_SWEEP_MAX)
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stopped:
+                return
+
+            began = time.perf_counter()
+            try:
+                sweep_one(self.manifest, self.indexer, self.source)
+            except Exception:
+                self.failures += 1
+                logger.exception('Sweep of %s failed (%d in a row)', self.source, self.failures)
+                continue
+            self.duration = time.perf_counter() - began
+            self.swept_at = time.time()
+            self.failures = 0
+            dispatcher.request()
+
+
+# source -> SourceSweeper, maintained by main(). `stopping` holds those whose
+# source has gone, until their thread has exited: one still in a sweep when its
+# source comes back must not get a second thread beside it.
+sweepers = {}
+stopping = {}
+
+
+class UploadDispatcher:
+    """
+    Runs dispatch_uploads() on one thread, whenever a sweep has recorded something.
+
+    Every sweeper asking for a dispatch would otherwise mean a pending_uploads()
+    query per source per interval, all returning the same rows. Requests made while
+    one runs are folded into the next, which starts after them and so sees
+    everything they committed. It also runs every SWEEP_INTERVAL regardless, which
+    is what retries a failed upload.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+
+    def start(self, manifest):
+        threading.Thread(
+            target=self._run, args=(manifest,), name='dispatch', daemon=True
+        ).start()
+
+    def request(self):
+        self._wake.set()
+
+    def _run(self, manifest):
+        while True:
+            self._wake.wait(SWEEP_INTERVAL)
+            self._wake.clear()
+            try:
+                dispatch_uploads(manifest)
+            except Exception:
+                logger.exception('Dispatch failed')
+
+
+dispatcher = UploadDispatcher()
+
+
+def sweep_ladder(indexer, source):
+    """
+    The transcoded renditions, which share one index entry per segment. Returns
+    what sweep_one() records: (namespace, rows) indexed and the pending uploads.
+    """
+    playlists = {}
+    for rendition in RENDITIONS:
+        path = Path(HLS_PATH) / f'{source}_{rendition}.m3u8'
+        if path.exists():
+            with parse_seconds.time(source, rendition):
+                entries, complete = playlist_follower.read(path)
+            playlists[rendition] = entries[:complete]
+
+    canonical = playlists.get(CANONICAL_RENDITION)
+    if not canonical:
+        return (None, []), []
+
+    assert_renditions_aligned(source, canonical, playlists)
+
+    indexed = indexer.append(canonical)
+    if indexed[1]:
+        with metrics_lock:
+            metrics['indexed'] += len(indexed[1])
+
+    # Every rendition's bytes still have to be uploaded individually, even though
+    # one index entry covers all of them.
+    return indexed, pending_rows(indexer.manifest, source, HLS_PATH,
+                                 [entry for entries in playlists.values() for entry in entries])
+
+
+def sweep_source(indexer, source):
     """
     The archive-only source rendition, from its own directory and its own index.
+    Returns the same as sweep_ladder().
 
     Segments land in the same hour prefix as the ladder's - the filename already
     carries `_source_`, so nothing collides - and only the index is separate.
     """
     if not ARCHIVE_SOURCE:
-        return
+        return (None, []), []
 
     path = Path(SOURCE_HLS_PATH) / f'{source}_{SOURCE_RENDITION}.m3u8'
     if not path.exists():
-        return
+        return (None, []), []
 
-    entries, complete = parse_playlist(path)
+    with parse_seconds.time(source, SOURCE_RENDITION):
+        entries, complete = playlist_follower.read(path)
     entries = entries[:complete]
     if not entries:
-        return
+        return (None, []), []
 
-    written = indexer.add_source(entries, SOURCE_HLS_PATH)
-    if written:
+    indexed = indexer.append_source(entries, SOURCE_HLS_PATH)
+    if indexed[1]:
         with metrics_lock:
-            metrics['indexed'] += written
+            metrics['indexed'] += len(indexed[1])
+
+    return indexed, pending_rows(indexer.manifest, source, SOURCE_HLS_PATH, entries)
+
+
+class PlaylistWatcher:
+    """
+    inotify on the playlist directories, reporting which sources have new entries.
+
+    Polling queues a freshly closed segment SWEEP_INTERVAL / 2 late on average, plus
+    however long the sweep takes, and sweeps every source when nothing has changed.
+    FFmpeg rewrites a playlist right after closing a segment - to a temporary file
+    renamed over it - so the rename is the moment there is something to index, and
+    naming the playlist names the source.
+
+    Through ctypes rather than a package because the image installs only boto3, and
+    three libc calls are all it takes. Events are a trigger, never the record: the
+    sweep re-reads the playlist, and the reconciling sweep still runs, so a lost or
+    overflowed event costs latency, not a segment.
+    """
 
-    for entry in entries:
-        local = Path(SOURCE_HLS_PATH) / entry.name
-        if manifest.known(local):
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    EVENT = struct.Struct('iIII')
+
+    # The three renditions come out of one FFmpeg, a few ms apart. Waiting this long
+    # after the first event lets one sweep cover all of them.
+    SETTLE = 0.05
+
+    def __init__(self, fd, directories):
+        self.fd = fd
+        self.directories = directories
+
+    @classmethod
+    def open(cls):
+        """A watcher on HLS_PATH and SOURCE_HLS_PATH, or None if inotify is unavailable."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1')
+            directories = [HLS_PATH] + ([SOURCE_HLS_PATH] if ARCHIVE_SOURCE else [])
+            for directory in directories:
+                if libc.inotify_add_watch(
+                    fd, os.fsencode(directory), cls.IN_CLOSE_WRITE | cls.IN_MOVED_TO
+                ) < 0:
+                    raise OSError(ctypes.get_errno(), f'inotify_add_watch {directory}')
+        except (OSError, AttributeError) as exc:
+            logger.warning('inotify unavailable (%s); polling every %ds instead',
+                           exc, SWEEP_INTERVAL)
+            return None
+        return cls(fd, directories)
+
+    def wait(self, timeout):
+        """
+        Sources whose playlists changed, waiting up to `timeout` seconds for one.
+        An empty set on timeout; None if the kernel dropped events, which only a
+        full sweep can make up for.
+        """
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        deadline = time.monotonic() + self.SETTLE
+        while True:
+            if not self._drain(changed):
+                return None
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([self.fd], [], [], left)[0]:
+                return changed
+
+    def _drain(self, changed):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return True
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return False
+            source = playlist_source(name)
+            if source:
+                changed.add(source)
+        return True
+
+
+def playlist_source(name):
+    """The source a rendition playlist belongs to, or None for anything else."""
+    if not name.endswith('.m3u8'):
+        return None
+    source, _, rendition = name[:-len('.m3u8')].rpartition('_')
+    if rendition in RENDITIONS or rendition == SOURCE_RENDITION:
+        return source
+    return None
+
+
+def pending_rows(manifest, source, directory, entries):
+    """record_pending_many() rows for every entry the manifest has not seen yet."""
+    # Joined as strings: building a Path per entry per sweep cost more than the rest
+    # of the sweep put together. str(Path()) keeps the stored form unchanged.
+    base = str(Path(directory))
+    paths = {f'{base}/{entry.name}': entry for entry in entries}
+    known = manifest.known_many(paths)
+    rows = []
+    for path, entry in paths.items():
+        if path in known:
             continue
-        manifest.record_pending(
-            local, f'{ARCHIVE_PREFIX}/{source}/{entry.hour}/{entry.name}', source
-        )
+        stat = _stat(path)
+        if stat is None:
+            # Reaped under disk pressure while the playlist still lists it, or gone
+            # for some other reason; either way there is nothing left to upload.
+            continue
+        captured, size = stat
+        backlog.produced(source, captured, size)
+        rows.append((path, f'{ARCHIVE_PREFIX}/{source}/{entry.hour}/{entry.name}',
+                     source, captured))
+    return rows
+
+
+def _mtime(path):
+    """When a segment was written, by the local clock the reaper measures age with.
+    Read once, when it is first recorded; a missing file counts as written now."""
+    stat = _stat(path)
+    return stat[0] if stat else time.time()
+
+
+def _stat(path):
+    """(mtime, size), or None if the file is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
 
 
 def dispatch_uploads(manifest):
@@ -792,31 +2523,325 @@ def dispatch_uploads(manifest):
     Hand pending segments to the upload workers, at most once each.
 
     A row stays in pending_uploads until its upload finishes and verifies, and the
-    sweep runs every few seconds, so spawning a thread per pending row per sweep
-    both re-uploaded segments already in flight and grew the thread count without
-    bound whenever S3 was slower than the sweep interval - which is exactly the
-    situation the upload cap is designed to produce. The semaphore bounded
-    concurrency but not the number of threads waiting on it.
+    sweep runs every few seconds, so queueing every pending row on every sweep
+    would upload the same segment several times over whenever S3 is slower than
+    the sweep interval - which is exactly the situation the upload cap is designed
+    to produce.
 
-    `inflight` is the missing piece: it is the set of paths some worker still owns.
+    `inflight` is the set of paths already queued or being uploaded; anything in it
+    is skipped until its worker is done with it.
     """
-    for path, key, _ in manifest.pending_uploads():
+    for path, key, _, captured in manifest.pending_uploads():
         with inflight_lock:
             if path in inflight:
                 continue
             inflight.add(path)
 
+        upload_pool.submit(upload_priority(path, captured), path, key)
+
+
+def upload_priority(path, captured):
+    """
+    Lower goes first. Age is what matters: the oldest pending segment is the one
+    closest to the reap horizon and to the disk filling. Redundant renditions are
+    handicapped by REDUNDANT_RENDITION_LAG rather than ranked strictly after the
+    others, so they are delayed under a backlog but never starved by it.
+    """
+    captured = captured or 0.0
+    rendition = Path(path).stem.rsplit('_', 3)[1:2]
+    if rendition and rendition[0] not in (CANONICAL_RENDITION, SOURCE_RENDITION):
+        captured += REDUNDANT_RENDITION_LAG
+    return captured
+
+
+class UploadPool:
+    """
+    A fixed set of upload workers fed from one priority queue.
+
+    This replaced a thread per pending segment parked on a semaphore. That bounded
+    concurrency but not threads: during an S3 slowdown it held one idle thread, and
+    its stack, for every segment waiting, and the order they went in was whichever
+    thread the semaphore woke next.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.threads = size
+        self.engine = None  # 'threads' or 'async' once started, whichever S3_ENGINE got
+        self.queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    def start(self, manifest):
+        if S3_ENGINE == 'async':
+            engine = AsyncUploadEngine.create(self, ASYNC_UPLOAD_CONCURRENCY)
+            if engine and engine.start(manifest):
+                self.engine = 'async'
+                self.size = engine.concurrency
+                return
+        self.start_threads(manifest)
+
+    def start_threads(self, manifest):
+        """The thread workers: the default engine, and the async one's fallback."""
+        self.engine = 'threads'
+        self.size = self.threads
+        for i in range(self.size):
+            threading.Thread(
+                target=self._work, args=(manifest,), name=f'upload-{i}', daemon=True
+            ).start()
+
+    def submit(self, priority, path, key):
+        # The counter breaks ties without ever comparing paths.
+        self.queue.put((priority, next(self._order), path, key))
+
+    def busy(self):
+        with self._busy_lock:
+            return self._busy
+
+    @contextmanager
+    def working(self, path):
+        """Counted as busy for the duration; out of `inflight` after, however it ends."""
+        with self._busy_lock:
+            self._busy += 1
+        try:
+            yield
+        except Exception:
+            logger.exception('Upload worker failed on %s', path)
+        finally:
+            with self._busy_lock:
+                self._busy -= 1
+            with inflight_lock:
+                inflight.discard(path)
+
+    def _work(self, manifest):
+        while True:
+            _, _, path, key = self.queue.get()
+            with self.working(path):
+                upload_segment(manifest, path, key)
+
+
+upload_pool = UploadPool(MAX_CONCURRENT_UPLOADS)
+
+
+class AsyncUploadEngine:
+    """
+    The upload pool's consumer for S3_ENGINE=async: one asyncio loop, one aiobotocore
+    client, ASYNC_UPLOAD_CONCURRENCY uploads in flight.
+
+    With threads, concurrency costs a thread per upload, each parked in a blocking
+    boto3 call for the whole round trip. A segment is small enough that the round
+    trip is most of an upload, so keeping hundreds in flight - what a backlog on a
+    high-latency link needs - meant hundreds of threads. Here an upload in flight
+    is a coroutine, and the connections under them are aiohttp's keep-alive pool,
+    sized to match, so a steady stream of PUTs reuses warm connections instead of
+    handshaking per request. HTTP/1.1 pipelining is not something S3 endpoints
+    can be relied on to honour, so concurrency comes from the pool, not from
+    stacking requests on one connection.
+
+    What still blocks - reading and hashing a segment, and the manifest - runs on a
+    few ASYNC_BLOCKING_THREADS, never on the loop. Multipart segments are rare and
+    already parallel, so they are handed to upload_segment() on that executor
+    unchanged, as are files that have gone missing.
+
+    The queue, priorities, `inflight` and the busy count are the pool's own, so
+    nothing else knows which engine is running.
+    """
+
+    def __init__(self, pool, concurrency, session, config, errors):
+        self.pool = pool
+        self.concurrency = concurrency
+        self.session = session
+        self.config = config
+        self.errors = errors
+        self.error = None
+        self._tasks = set()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        # path -> pool queue item, for what _take() has handed to the loop and the
+        # loop has not started yet. Put back on the pool's queue if the loop dies.
+        self._handoff = {}
+        self._handoff_lock = threading.Lock()
+
+    @classmethod
+    def create(cls, pool, concurrency):
+        """
+        An engine, or None - with a warning - if aiobotocore is not installed or will
+        not take the uploader's client settings.
+        """
+        try:
+            import aiohttp
+            from aiobotocore.config import AioConfig
+            from aiobotocore.session import get_session
+        except ImportError:
+            logger.warning('S3_ENGINE=async needs aiobotocore; using %d upload threads',
+                           pool.threads)
+            return None
+        try:
+            config = AioConfig(
+                max_pool_connections=concurrency,
+                retries=boto_config.retries,
+                read_timeout=boto_config.read_timeout,
+                connect_timeout=boto_config.connect_timeout,
+                request_checksum_calculation=boto_config.request_checksum_calculation,
+                connector_args={'keepalive_timeout': 30},
+            )
+        except (TypeError, ValueError) as exc:
+            logger.warning('aiobotocore rejected the client settings (%s); using %d upload '
+                           'threads', exc, pool.threads)
+            return None
+        # aiobotocore turns most of aiohttp's failures into botocore's, not all.
+        errors = (*S3_ERRORS, aiohttp.ClientError, asyncio.TimeoutError)
+        return cls(pool, concurrency, get_session(), config, errors)
+
+    def start(self, manifest):
+        """
+        Start the loop and wait until it has a client. False, having logged why, if it
+        could not make one, so the pool can start its threads instead.
+        """
         threading.Thread(
-            target=_upload_and_release, args=(manifest, path, key), daemon=True
+            target=self._run, args=(manifest,), name='upload-async', daemon=True,
         ).start()
+        self._ready.wait()
+        if self._stopped.is_set():
+            logger.warning('Could not start the async upload engine (%s); using %d upload '
+                           'threads', self.error, self.pool.threads)
+            return False
+        logger.info('Uploading through one event loop, %d in flight', self.concurrency)
+        return True
+
+    def _run(self, manifest):
+        """
+        The loop's thread. Should the loop ever end, what it had taken goes back on
+        the pool's queue and the pool carries on with threads, rather than uploads
+        stopping while `inflight` still claims them.
+        """
+        try:
+            asyncio.run(self._serve(manifest))
+        except Exception as exc:
+            self.error = exc
+        started = self._ready.is_set()
+        self._stopped.set()
+        self._ready.set()
+        self._slots.release()  # in case _take() is waiting for one
+        self._requeue()
+        if started:
+            logger.error('Async upload engine stopped (%s); falling back to %d upload threads',
+                         self.error, self.pool.threads)
+            self.pool.start_threads(manifest)
+
+    async def _serve(self, manifest):
+        loop = asyncio.get_running_loop()
+        blocking = ThreadPoolExecutor(ASYNC_BLOCKING_THREADS, thread_name_prefix='upload-io')
+        ready = asyncio.Queue()
+
+        async with self.session.create_client('s3', **dict(_s3_kwargs, config=self.config)) as client:
+            self._ready.set()
+            # queue.get() blocks, so it gets a thread of its own rather than one of
+            # those, and a plain daemon one: an executor's threads are joined at exit.
+            threading.Thread(
+                target=self._take, args=(loop, ready), name='upload-take', daemon=True
+            ).start()
+            while True:
+                path = await ready.get()
+                with self._handoff_lock:
+                    _, _, path, key = self._handoff[path]
+                task = asyncio.create_task(self._upload(client, blocking, manifest, path, key))
+                with self._handoff_lock:
+                    del self._handoff[path]
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(lambda _: self._slots.release())
+
+    def _take(self, loop, ready):
+        """Move the pool's queue onto the loop, one item per free slot, so priority
+        order still decides what goes next rather than what was taken first. Stops,
+        leaving the item it holds for the threads, once the loop has."""
+        while True:
+            self._slots.acquire()
+            item = self.pool.queue.get()
+            with self._handoff_lock:
+                self._handoff[item[2]] = item
+            if self._stopped.is_set():
+                break
+            try:
+                loop.call_soon_threadsafe(ready.put_nowait, item[2])
+            except RuntimeError:
+                # The loop has closed.
+                break
+        self._requeue()
+
+    def _requeue(self):
+        with self._handoff_lock:
+            items, self._handoff = list(self._handoff.values()), {}
+        for item in items:
+            self.pool.queue.put(item)
+
+    async def _upload(self, client, blocking, manifest, path, key):
+        loop = asyncio.get_running_loop()
+        with self.pool.working(path):
+            segment = await loop.run_in_executor(blocking, _read_segment, path)
+            if segment is None:
+                await loop.run_in_executor(blocking, upload_segment, manifest, path, key)
+            elif segment[0]:
+                await self._put(client, blocking, manifest, path, key, *segment)
+
+    async def _put(self, client, blocking, manifest, path, key, data, digest, proof):
+        """put_single(), awaited."""
+        loop = asyncio.get_running_loop()
+        labels = segment_labels(path)
+        began = time.perf_counter()
+        # The full wait, not one bounded as a thread's sleep is; see reserve().
+        delay = upload_limiter.reserve(upload_lane(path), len(data), most=None)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        try:
+            with s3_seconds.time('put', *labels):
+                response = await client.put_object(
+                    Bucket=S3_BUCKET, Key=key, Body=data, ContentType='video/mp2t', **proof,
+                )
+            etag = response.get('ETag', '').strip('"')
+            if not confirmed_by_put(response, digest):
+                with s3_seconds.time('head', *labels):
+                    head = await client.head_object(Bucket=S3_BUCKET, Key=key)
+                etag = head.get('ETag', '').strip('"')
+                if head['ContentLength'] != len(data):
+                    logger.error(
+                        'Size mismatch for %s: local %d, remote %d. Not marking verified.',
+                        key, len(data), head['ContentLength'],
+                    )
+                    etag = None
+        except self.errors as exc:
+            logger.error('Upload failed for %s: %s', key, exc)
+            with metrics_lock:
+                metrics['failed'] += 1
+            return
 
+        await loop.run_in_executor(
+            blocking, record_upload, manifest, path, len(data), etag, began
+        )
 
-def _upload_and_release(manifest, path, key):
+
+def _read_segment(path):
+    """
+    (bytes, digest, put_object proof) for a segment the async engine can PUT whole,
+    or None for one it leaves to upload_segment(): gone, or big enough for multipart.
+
+    Read rather than mapped, unlike put_single(): botocore only takes bytes or a
+    file object as a Body, and aiohttp reads a file object a chunk at a time through
+    an executor. One read into bytes, which aiohttp then writes as they are, is the
+    single copy this path makes.
+    """
     try:
-        upload_segment(manifest, path, key)
-    finally:
-        with inflight_lock:
-            inflight.discard(path)
+        with open(path, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size >= MULTIPART_THRESHOLD:
+                return None
+            data = fh.read()
+    except FileNotFoundError:
+        return None
+    return (data, *segment_digest(data))
 
 
 def periodic(interval, fn, *args):
@@ -828,47 +2853,298 @@ def periodic(interval, fn, *args):
             logger.exception('%s failed', getattr(fn, '__name__', fn))
 
 
+def exposition(manifest):
+    """
+    Everything, in the Prometheus text format. Counters and queues are read at the
+    moment of the scrape; what takes a scan is read from `scanned`.
+    """
+    lines = []
+
+    def gauge(name, doc, samples, kind='gauge'):
+        lines.append(f'# HELP {name} {doc}')
+        lines.append(f'# TYPE {name} {kind}')
+        for pairs, value in samples:
+            lines.append(f'{name}{_labels(pairs)} {value}')
+
+    with metrics_lock:
+        counts = dict(metrics)
+    for name, value in counts.items():
+        gauge(f'archive_uploader_{name}_total', f'Segments {name} since start.',
+              [([], value)], kind='counter')
+
+    gauge('archive_uploader_pending_segments', 'Segments recorded and not yet verified.',
+          [([], scanned.pending)])
+    gauge('archive_uploader_upload_queue_depth', 'Segments queued for an upload worker.',
+          [([], upload_pool.queue.qsize())])
+    gauge('archive_uploader_uploads_inflight', 'Upload workers busy right now.',
+          [([], upload_pool.busy())])
+
+    now = time.time()
+    gauge('archive_uploader_oldest_unverified_seconds',
+          'Age of the oldest segment S3 has not confirmed yet.',
+          [([('source', source), ('rendition', rendition)], round(now - captured, 3))
+           for (source, rendition), captured in sorted(scanned.oldest.items())])
+    gauge('archive_uploader_disk_bytes', 'Segment bytes on the local volume.',
+          [([('source', source), ('rendition', rendition)], size)
+           for (source, rendition), size in sorted(scanned.disk.items())])
+    if scanned.at is not None:
+        gauge('archive_uploader_scan_age_seconds',
+              'Time since pending, oldest unverified and disk bytes were last scanned.',
+              [([], round(now - scanned.at, 3))])
+
+    rates = sorted(backlog.rates().items())
+    gauge('archive_uploader_ingest_bytes_per_second',
+          'Segment bytes the transcoder produced, over the backlog model window.',
+          [([('source', source)], round(ingest, 1)) for source, (ingest, _) in rates])
+    gauge('archive_uploader_egress_bytes_per_second',
+          'Segment bytes confirmed in S3, over the backlog model window.',
+          [([('source', source)], round(egress, 1)) for source, (_, egress) in rates])
+    current = sorted(sweepers.items())
+    gauge('archive_uploader_sweep_last_seconds', 'How long the last completed sweep took.',
+          [([('source', source)], round(s.duration, 6))
+           for source, s in current if s.duration is not None])
+    gauge('archive_uploader_sweep_age_seconds', 'Time since the last completed sweep.',
+          [([('source', source)], round(now - s.swept_at, 3))
+           for source, s in current if s.swept_at is not None])
+    gauge('archive_uploader_sweep_failures', 'Consecutive failed sweeps.',
+          [([('source', source)], s.failures) for source, s in current])
+    gauge('archive_uploader_dvr_window_seconds',
+          'Rewind window the reaper keeps locally; below DVR_WINDOW_SECONDS under disk pressure.',
+          [([], disk_watchdog.window())])
+    gauge('archive_uploader_disk_pressure_step', 'Disk pressure step in effect, 0 for none.',
+          [([], disk_watchdog.level)])
+    free, growth, eta = backlog.projection()
+    if free is not None:
+        gauge('archive_uploader_disk_free_bytes', 'Free space on the HLS volume.',
+              [([], free)])
+    gauge('archive_uploader_disk_full_seconds',
+          'Projected time until the HLS volume fills; +Inf while uploads keep up.',
+          [([], round(eta, 1) if eta != float('inf') else '+Inf')])
+
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class ScannedGauges:
+    """
+    The gauges that cost a scan, refreshed on the disk watchdog's
+    DISK_CHECK_INTERVAL and only read by a scrape.
+
+    disk_usage() stats every segment in the HLS directories, and the manifest
+    queries read every unverified row of the database the uploader is writing to.
+    Run per scrape, on the metrics thread, their cost was set by whoever scraped and
+    how often, not by the uploader.
+    """
+
+    def __init__(self):
+        self.pending = 0
+        self.oldest = {}
+        self.disk = {}
+        self.at = None
+
+    def refresh(self, manifest):
+        pending = manifest.pending_count()
+        oldest = manifest.oldest_unverified()
+        disk = disk_usage()
+        self.pending, self.oldest, self.disk, self.at = pending, oldest, disk, time.time()
+
+
+scanned = ScannedGauges()
+
+
+def disk_usage():
+    """{(source, rendition): bytes} of the segments in the HLS directories."""
+    usage = {}
+    for directory in {HLS_PATH, SOURCE_HLS_PATH}:
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith('.ts'):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue  # reaped between the listing and the stat
+                labels = segment_labels(entry.name)
+                usage[labels] = usage.get(labels, 0) + size
+    return usage
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            body = exposition(self.server.manifest).encode()
+        except Exception:
+            logger.exception('Metrics scrape failed')
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape would drown the uploader's own log
+
+
+def serve_metrics(manifest):
+    server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), MetricsHandler)
+    server.daemon_threads = True
+    server.manifest = manifest
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info('Metrics on %s:%d/metrics', METRICS_HOST, METRICS_PORT)
+
+
+class BacklogModel:
+    """
+    Ingest against egress, per source, and when the origin disk fills at that rate.
+
+    This replaced a check that pending_count() had risen for five minutes straight,
+    judged against a hard-coded 11.5 Mbps per source. That missed a backlog that
+    grew in steps rather than strictly, said nothing about how long was left, and
+    could not see the source rendition at all, whose bitrate is whatever the
+    publisher sends.
+
+    Ingest is the bytes of every segment the sweep records, counted at its mtime, so
+    the full window recorded at a restart counts only the part written within the
+    window - what the transcoder produced recently, not what piled up. Egress is the
+    bytes of every upload confirmed. Both are averaged over BACKLOG_MODEL_WINDOW.
+
+    Whatever ingest outruns egress by stays on disk, because the reaper only removes
+    what S3 has confirmed, so the disk fills at that difference. When uploads keep
+    up there is no difference and no projection, which is also what a healthy
+    origin looks like.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.started = time.time()
+        self._produced = {}
+        self._uploaded = {}
+        self._lock = threading.Lock()
+
+    def produced(self, source, at, size):
+        if at > time.time() - self.window:
+            with self._lock:
+                self._produced.setdefault(source, []).append((at, size))
+
+    def uploaded(self, source, size):
+        with self._lock:
+            self._uploaded.setdefault(source, []).append((time.time(), size))
+
+    def rates(self):
+        """{source: (ingest, egress)} in bytes/s."""
+        now = time.time()
+        since = now - self.window
+        # Ingest is dated by mtime, so it covers the whole window even just after a
+        # restart. Egress only starts counting at startup, so until the model has
+        # been up for a window, it is divided by what has been seen.
+        uptime = max(min(self.window, now - self.started), 1)
+        rates = {}
+        with self._lock:
+            for samples in (self._produced, self._uploaded):
+                for source, events in samples.items():
+                    samples[source] = events = [e for e in events if e[0] > since]
+            for source in self._produced.keys() | self._uploaded.keys():
+                rates[source] = (
+                    sum(size for _, size in self._produced.get(source, ())) / self.window,
+                    sum(size for _, size in self._uploaded.get(source, ())) / uptime,
+                )
+        return rates
+
+    def projection(self):
+        """(free bytes on the HLS volume, net growth in bytes/s, seconds until full).
+        Seconds is infinite while uploads keep up."""
+        rates = self.rates()
+        growth = sum(ingest - egress for ingest, egress in rates.values())
+        space = disk_space(HLS_PATH)
+        if space is None:
+            return None, growth, float('inf')
+        free = space[0]
+        return free, growth, free / growth if growth > 0 else float('inf')
+
+
+backlog = BacklogModel(BACKLOG_MODEL_WINDOW)
+
+
 def report(manifest):
     """
-    Metrics, plus a standing check that the upload cap is above the ingest rate.
+    Metrics, plus a standing check that uploads keep up with ingest.
 
     Setting MAX_UPLOAD_RATE_MBPS below what the transcoder produces does not degrade
     gracefully: uploads simply fall behind for hours and then the origin disk fills.
-    The symptom appears a long way from the cause, so watch the backlog trend and say
-    so early. A rising backlog across several minutes means the cap (or the link) is
-    under the ingest rate, not that a single upload was slow.
+    The symptom appears a long way from the cause, so project it from the measured
+    rates (see BacklogModel) and say so while there is still time to act on it.
+
+    Throughput is logged per limiter lane, so a source starved of its share shows
+    up by name rather than only as a growing total.
     """
-    history = []
+    last = time.monotonic()
 
     while True:
         time.sleep(60)
+        now = time.monotonic()
+        sent = upload_limiter.throughput()
+        elapsed, last = now - last, now
+        if sent:
+            logger.info('Upload throughput: %s', ', '.join(
+                f'{lane} {count * 8 / elapsed / 1_000_000:.1f} Mbps'
+                for lane, count in sorted(sent.items())
+            ))
+
+        slowest = sorted(
+            (s for s in list(sweepers.values()) if s.duration is not None),
+            key=lambda s: s.duration, reverse=True,
+        )[:5]
+        if slowest:
+            logger.info('Slowest sweeps: %s', ', '.join(
+                f'{s.source} {s.duration * 1000:.0f}ms' for s in slowest
+            ))
+        for sweeper in list(sweepers.values()):
+            if sweeper.failures:
+                logger.warning('Source %s has failed its last %d sweep(s)',
+                               sweeper.source, sweeper.failures)
 
         pending = manifest.pending_count()
-        history.append(pending)
-        history = history[-5:]
-
         with metrics_lock:
             logger.info(
-                'indexed=%d uploaded=%d verified=%d reaped=%d failed=%d pending=%d',
+                'indexed=%d uploaded=%d verified=%d reaped=%d failed=%d pending=%d '
+                'queued=%d uploading=%d/%d',
                 metrics['indexed'], metrics['uploaded'], metrics['verified'],
                 metrics['reaped'], metrics['failed'], pending,
+                upload_pool.queue.qsize(), upload_pool.busy(), upload_pool.size,
             )
 
-        if len(history) == 5 and all(b < a for b, a in zip(history, history[1:])):
-            sources = len(discover_sources()) or 1
-            # Measured ladder total, Mbps per source. With ARCHIVE_SOURCE on, the
-            # publisher's own bitrate rides on top and is not knowable from here, so
-            # this is a floor on the floor rather than the real requirement.
-            needed = sources * 11.5
-            logger.error(
-                'Upload backlog has grown for %d minutes straight (%s). The archive '
-                'is not keeping up with ingest and the origin disk will fill. %d '
-                'source(s) need at least ~%.0f Mbps sustained (plus the contribution '
-                'bitrate again, per source, while the source archive is on); cap is %s.',
-                len(history), ' -> '.join(str(h) for h in history), sources, needed,
-                f'{MAX_UPLOAD_RATE_MBPS} Mbps' if MAX_UPLOAD_RATE_MBPS > 0
-                else 'unlimited (so the link itself is the limit)',
-            )
+        free, growth, eta = backlog.projection()
+        if eta > DISK_FULL_WARN_HOURS * 3600:
+            continue
+
+        rates = backlog.rates()
+        ingest = sum(i for i, _ in rates.values())
+        egress = sum(e for _, e in rates.values())
+        behind = sorted(rates.items(), key=lambda item: item[1][1] - item[1][0])[:3]
+        logger.error(
+            'Origin disk projected full in %.1fh: ingest %.1f Mbps, uploads %.1f Mbps, '
+            '%.1f GB free on %s, %d segment(s) pending. Furthest behind: %s. Upload '
+            'cap is %s.',
+            eta / 3600, _mbps(ingest), _mbps(egress), free / 1e9, HLS_PATH, pending,
+            ', '.join(f'{source} {_mbps(i):.1f} in / {_mbps(e):.1f} out'
+                      for source, (i, e) in behind),
+            f'{MAX_UPLOAD_RATE_MBPS} Mbps' if MAX_UPLOAD_RATE_MBPS > 0
+            else 'unlimited (so the link itself is the limit)',
+        )
+
+
+def _mbps(bytes_per_sec):
+    return bytes_per_sec * 8 / 1_000_000
 
 
 def main():
@@ -879,10 +3155,15 @@ def main():
         'Source archive: %s',
         f'on, from {SOURCE_HLS_PATH} into index-source.m3u8' if ARCHIVE_SOURCE else 'off',
     )
-    logger.info('Rewind window held locally: %ds', DVR_WINDOW_SECONDS)
     logger.info(
-        'Upload cap: %s',
+        'Rewind window held locally: %ds, down to %ds under disk pressure (%s)',
+        DVR_WINDOW_SECONDS, DVR_WINDOW_FLOOR_SECONDS,
+        ', '.join(f'{fraction:g}x below {percent:g}%' for percent, fraction in DISK_PRESSURE_STEPS),
+    )
+    logger.info(
+        'Upload cap: %s%s',
         f'{MAX_UPLOAD_RATE_MBPS} Mbps' if MAX_UPLOAD_RATE_MBPS > 0 else 'unlimited',
+        f', shares {UPLOAD_SHARES}' if UPLOAD_SHARES else '',
     )
 
     Path(INDEX_PATH).mkdir(parents=True, exist_ok=True)
@@ -897,20 +3178,55 @@ def main():
         # meanwhile rather than being lost.
         logger.error('Bucket %s not reachable yet: %s', S3_BUCKET, exc)
 
+    upload_pool.start(manifest)
+    if METRICS_PORT:
+        serve_metrics(manifest)
     threading.Thread(target=report, args=(manifest,), daemon=True).start()
     threading.Thread(
         target=periodic, args=(INDEX_UPLOAD_INTERVAL, indexer.flush), daemon=True
     ).start()
-    threading.Thread(
-        target=periodic, args=(REAP_INTERVAL, reap, manifest), daemon=True
-    ).start()
+    threading.Thread(target=reap_loop, args=(manifest,), daemon=True).start()
+
+    dispatcher.start(manifest)
+
+    watcher = PlaylistWatcher.open() if SWEEP_MODE == 'inotify' else None
+    if watcher:
+        logger.info('Sweeping on playlist changes, reconciling every %ds', RECONCILE_INTERVAL)
+    # With a watcher, a source's own interval is only the reconciling backstop.
+    interval = RECONCILE_INTERVAL if watcher else SWEEP_INTERVAL
 
     while True:
+        # Which sources exist is checked every SWEEP_INTERVAL. It is a listing of
+        # the whole HLS directory, too much to repeat for every playlist event.
         try:
-            sweep(manifest, indexer)
-        except Exception:
-            logger.exception('Sweep failed')
-        time.sleep(SWEEP_INTERVAL)
+            live = set(discover_sources())
+        except OSError as exc:
+            logger.error('Could not list sources: %s', exc)
+            live = set(sweepers)
+        for source in sorted(live - sweepers.keys()):
+            old = stopping.get(source)
+            if old is not None and not old.join(SourceSweeper.JOIN_TIMEOUT):
+                logger.info('Sweeper for %s is still finishing, starting it next pass', source)
+                continue
+            stopping.pop(source, None)
+            sweepers[source] = SourceSweeper(source, manifest, indexer, interval)
+            sweepers[source].start()
+        for source in sorted(sweepers.keys() - live):
+            stopping[source] = sweepers.pop(source)
+            stopping[source].stop()
+        for source in [name for name, sweeper in stopping.items() if sweeper.join(0)]:
+            del stopping[source]
+
+        if watcher is None:
+            time.sleep(SWEEP_INTERVAL)
+            continue
+
+        until = time.monotonic() + SWEEP_INTERVAL
+        while time.monotonic() < until:
+            changed = watcher.wait(max(0.0, until - time.monotonic()))
+            for source in list(sweepers) if changed is None else changed:
+                if source in sweepers:
+                    sweepers[source].poke()
 
 
 if __name__ == '__main__':
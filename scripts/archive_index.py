@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Read an hour index out of the archive, whichever form it is in.
+
+  ./scripts/archive_index.py prime 20260815/12           the ladder's index
+  ./scripts/archive_index.py prime 20260815/12 source    the source rendition's
+  ./scripts/archive_index.py range prime 2026-08-15T12:10:00Z 2026-08-15T12:20:00Z [source]
+
+The archive uploader keeps an hour it is still writing as part objects beside its
+index, and compacts them into index.m3u8 once the hour is over, gzipped and stored as
+Content-Encoding: gzip (see Indexer.flush in docker/archive-uploader). Hours imported
+by vod-to-archive.sh are a plain index.m3u8. read_hour_index() returns the playlist
+text for all three, as ArchivePlaylistService does on the app side.
+
+`range` lists the segments starting inside a time range, one per line, selected and
+ordered as a cut selects them. A closed hour also has a fixed-width binary sidecar,
+index.idx, which Sidecar searches with a few ranged GETs rather than fetching the
+hour. The sidecar is only written when the hour is compacted, so the hour still being
+written, and the one before it until INDEX_CLOSE_GRACE has passed, have none: those
+are read and parsed whole, parts and all, as is an imported hour.
+
+Takes the uploader's S3_* and ARCHIVE_PREFIX settings from the environment, and needs
+boto3.
+"""
+
+import gzip
+import os
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.exceptions import ClientError
+
+S3_BUCKET = os.environ.get('S3_BUCKET', 'streaming-recordings')
+S3_REGION = os.environ.get('S3_REGION', 'eu-central-1')
+S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY')
+S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY')
+S3_ENDPOINT = os.environ.get('S3_ENDPOINT')
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'archive')
+SOURCE_RENDITION = os.environ.get('SOURCE_RENDITION', 'source')
+
+# How long after an hour the uploader may still be writing it as parts. Matches
+# ArchivePlaylistService::hourIsRecent().
+RECENT = timedelta(hours=2)
+
+# The sidecar layout, as build_sidecar() in the uploader writes it.
+SIDECAR_MAGIC = b'AIDX'
+SIDECAR_VERSION = 1
+SIDECAR_HEADER = struct.Struct('<4sHH')
+SIDECAR_RECORD = struct.Struct('<qqqIqI')
+
+
+def client():
+    kwargs = {'region_name': S3_REGION}
+    if S3_ACCESS_KEY and S3_SECRET_KEY:
+        kwargs['aws_access_key_id'] = S3_ACCESS_KEY
+        kwargs['aws_secret_access_key'] = S3_SECRET_KEY
+    if S3_ENDPOINT:
+        kwargs['endpoint_url'] = S3_ENDPOINT
+    return boto3.client('s3', **kwargs)
+
+
+def index_key(source, hour, rendition='hd'):
+    name = 'index-source.m3u8' if rendition == SOURCE_RENDITION else 'index.m3u8'
+    return f'{ARCHIVE_PREFIX}/{source}/{hour}/{name}'
+
+
+def decode(body):
+    """
+    Index bytes as text, gunzipped if they are gzip.
+
+    botocore hands back the bytes S3 stored, while other clients undo
+    Content-Encoding on the way in, so this goes by the bytes rather than the header.
+    A playlist starts with #EXTM3U, which can never be mistaken for the gzip magic.
+    """
+    if body[:2] == b'\x1f\x8b':
+        body = gzip.decompress(body)
+    return body.decode()
+
+
+def read_object(s3, key):
+    """The object's bytes, or None if there is no such key."""
+    try:
+        return s3.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+    except ClientError as exc:
+        if exc.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
+
+def read_parts(s3, key):
+    """
+    An open hour reassembled from the part objects beside `key`, or None.
+
+    Parts are named by zero-padded byte offset, so they list in file order. One that
+    overlaps what is already read is trimmed and one merged away since the listing is
+    skipped; a gap means the listing is out of date and reads as no parts at all.
+    """
+    prefix = key[:-len('.m3u8')] + '.parts/'
+    pages = s3.get_paginator('list_objects_v2').paginate(Bucket=S3_BUCKET, Prefix=prefix)
+    contents = b''
+    for part in sorted(obj['Key'] for page in pages for obj in page.get('Contents', [])):
+        offset = int(part.rsplit('/', 1)[1])
+        if offset > len(contents):
+            return None
+        body = read_object(s3, part)
+        if body is not None:
+            contents += body[len(contents) - offset:]
+    return contents.decode() if contents else None
+
+
+def read_hour_index(s3, source, hour, rendition='hd'):
+    """The hour's index as playlist text, or None if the archive has no such hour."""
+    key = index_key(source, hour, rendition)
+    began = datetime.strptime(hour, '%Y%m%d/%H').replace(tzinfo=timezone.utc)
+
+    if datetime.now(timezone.utc) - began < RECENT + timedelta(hours=1):
+        # Parts first: the uploader may still be writing this hour.
+        text = read_parts(s3, key)
+        if text is not None:
+            return text
+
+    body = read_object(s3, key)
+    if body is not None:
+        return decode(body)
+    return read_parts(s3, key)
+
+
+class Sidecar:
+    """
+    An hour's sidecar in S3, read with ranged GETs and never fetched whole.
+
+    Records sit at fixed offsets in PDT order, so finding where a time falls is a
+    search over record numbers. Each probe fetches a block of BLOCK records rather
+    than one, since a GET costs a round trip whatever its size, and the first probe
+    goes where the time would be if every segment lasted as long as the first. Segments
+    are a steady 2s on the ladder, so that usually lands in the right block and a
+    range costs three GETs: the header, and one for each end, with the records
+    between fetched in the one ranged GET records() makes. Guesses that miss still
+    narrow the search, and after one the probes are plain bisection, so a lookup
+    takes O(log n) GETs at worst.
+    """
+
+    BLOCK = 64
+
+    def __init__(self, s3, key):
+        self.s3 = s3
+        self.key = key
+        self.gets = 0
+        self._pdt = {}
+
+        body, total = self._get(0, SIDECAR_HEADER.size + SIDECAR_RECORD.size)
+        magic, version, self.width = SIDECAR_HEADER.unpack_from(body)
+        if magic != SIDECAR_MAGIC or version != SIDECAR_VERSION:
+            raise ValueError(f'{key} is not a version {SIDECAR_VERSION} sidecar')
+        self.count = (total - SIDECAR_HEADER.size) // self.width
+        self._first = None
+        if self.count:
+            self._first = SIDECAR_RECORD.unpack_from(body, SIDECAR_HEADER.size)
+
+    def _get(self, start, length):
+        """`length` bytes from `start`, and the object's total size."""
+        self.gets += 1
+        response = self.s3.get_object(
+            Bucket=S3_BUCKET, Key=self.key, Range=f'bytes={start}-{start + length - 1}',
+        )
+        return response['Body'].read(), int(response['ContentRange'].rsplit('/', 1)[1])
+
+    def _block(self, around):
+        """Fetch the block of records centred on `around`, caching their PDTs."""
+        start = max(0, min(around - self.BLOCK // 2, self.count - self.BLOCK))
+        end = min(self.count, start + self.BLOCK)
+        body, _ = self._get(SIDECAR_HEADER.size + start * self.width, (end - start) * self.width)
+        for i in range(start, end):
+            self._pdt[i] = struct.unpack_from('<q', body, (i - start) * self.width)[0]
+        return start, end
+
+    def bisect(self, pdt_ms):
+        """The first record whose PDT is at or after `pdt_ms`, or `count` if none is."""
+        lo, hi = 0, self.count
+        guess = None
+        if self._first and self._first[3]:
+            guess = (pdt_ms - self._first[0]) * 1000 // self._first[3]
+
+        # The answer stays within [lo, hi]. Every probe lies inside it, and whichever
+        # side of the answer its block falls on, the interval shrinks, so this ends.
+        while lo < hi:
+            probe = guess if guess is not None and lo <= guess < hi else (lo + hi) // 2
+            guess = None
+            start, end = self._block(probe)
+            if self._pdt[start] >= pdt_ms:
+                hi = min(hi, start)
+            elif self._pdt[end - 1] < pdt_ms:
+                lo = max(lo, end)
+            else:
+                return next(i for i in range(start + 1, end) if self._pdt[i] >= pdt_ms)
+        return lo
+
+    def records(self, lo, hi):
+        """Records lo..hi-1 as (pdt_ms, observed_ms, seq, duration_us, session, n)."""
+        if lo >= hi:
+            return []
+        body, _ = self._get(SIDECAR_HEADER.size + lo * self.width, (hi - lo) * self.width)
+        return [SIDECAR_RECORD.unpack_from(body, i * self.width) for i in range(hi - lo)]
+
+
+def parse_records(index):
+    """An hour index's text as sidecar records, for an hour that has no sidecar yet."""
+    records = []
+    seq = observed = duration = pdt = None
+    for line in index.splitlines():
+        if line.startswith('#EXT-X-ARCHIVE-SEQ:'):
+            seq = int(line[19:])
+        elif line.startswith('#EXT-X-ARCHIVE-OBSERVED:'):
+            observed = _ms(line[24:])
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[8:].split(',')[0])
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            pdt = _ms(line[25:])
+        elif line and not line.startswith('#'):
+            _, session, n = line[:-3].rsplit('_', 2)
+            if pdt is not None and duration is not None:
+                records.append((
+                    pdt, observed or 0, seq if seq is not None else len(records),
+                    round(duration * 1_000_000), int(session) if session.isdigit() else 0,
+                    int(n),
+                ))
+            seq = observed = duration = pdt = None
+    return records
+
+
+def _ms(value):
+    return round(datetime.strptime(value.strip(), '%Y-%m-%dT%H:%M:%S.%f%z').timestamp() * 1000)
+
+
+def segments_between(s3, source, start, end, rendition='hd'):
+    """
+    Records for the segments whose PDT falls in [start, end), in archive sequence
+    order: the same selection, in the same order, ArchivePlaylistService::
+    segmentsInRange() makes. An hour without a sidecar, which includes the recent
+    ones, costs a fetch of its whole index.
+    """
+    start_ms, end_ms = round(start.timestamp() * 1000), round(end.timestamp() * 1000)
+    name = 'index-source.idx' if rendition == SOURCE_RENDITION else 'index.idx'
+    hour = start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    found = []
+    while hour < end:
+        bucket = hour.strftime('%Y%m%d/%H')
+        try:
+            sidecar = Sidecar(s3, f'{ARCHIVE_PREFIX}/{source}/{bucket}/{name}')
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                raise
+            text = read_hour_index(s3, source, bucket, rendition) or ''
+            found += [r for r in parse_records(text) if start_ms <= r[0] < end_ms]
+        else:
+            found += sidecar.records(sidecar.bisect(start_ms), sidecar.bisect(end_ms))
+        hour += timedelta(hours=1)
+
+    # By seq, not PDT: a publisher's clock set back between sessions puts PDTs out
+    # of order, and the sequence is the one ordering no clock can disturb.
+    return sorted(found, key=lambda record: record[2])
+
+
+def print_range(s3, source, start, end, rendition='hd'):
+    start, end = (datetime.fromisoformat(t.replace('Z', '+00:00')) for t in (start, end))
+    for pdt, _, seq, duration, session, n in segments_between(s3, source, start, end, rendition):
+        at = datetime.fromtimestamp(pdt / 1000, timezone.utc).isoformat(timespec='milliseconds')
+        print(f'{seq}\t{at}\t{duration / 1e6:.3f}\t{source}_{rendition}_{session}_{n:06d}.ts')
+    return 0
+
+
+def main(argv):
+    if argv[:1] == ['range'] and len(argv) in (4, 5):
+        return print_range(client(), *argv[1:])
+
+    if len(argv) not in (2, 3):
+        print(__doc__.strip())
+        return 1
+
+    text = read_hour_index(client(), *argv)
+    if text is None:
+        print(f'no index for {argv[0]} {argv[1]}', file=sys.stderr)
+        return 1
+    sys.stdout.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
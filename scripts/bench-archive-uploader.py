@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+What does one archive-uploader sweep cost, and what does it grow with?
+
+Runs the uploader's own code against synthetic playlists in a scratch directory,
+so it needs neither a transcoder nor a bucket. Only `transfer` talks to S3.
+
+  ./scripts/bench-archive-uploader.py sweep              1, 5 and 20 sources
+  ./scripts/bench-archive-uploader.py sweep 1 40         any source counts
+  ./scripts/bench-archive-uploader.py index              indexing a restart backlog
+  ./scripts/bench-archive-uploader.py transfer [n] [kb]  upload engines, n segments
+
+Each run reports two numbers per source count. `cold` is the first sweep over a
+full 900-entry window, which is what a restart costs. `steady` is the median of
+the sweeps after it, each seeing one new segment per playlist, which is what the
+uploader does every SWEEP_INTERVAL for as long as the con runs. The second number
+is the one that has to stay well under SWEEP_INTERVAL.
+
+`index` times the indexer alone on what it faces after a restart: a full window
+of entries it has not seen, for the ladder's hour file and the source's.
+
+`transfer` uploads a backlog of small segments (default 1000 x 256 KB) through
+each upload engine in turn and reports segments per second, how many threads it
+took and the uploader's CPU time per GB sent. `spawn` is the baseline the pool
+replaced: a thread per pending segment, parked on a semaphore until one of
+`concurrency` slots frees. It needs a bucket it can create:
+point S3_ENDPOINT, S3_ACCESS_KEY and S3_SECRET_KEY at a MinIO or `moto_server`,
+never at the real archive, run as its own process so its CPU is not counted. The
+async engine needs aiobotocore.
+
+Needs boto3 importable, because the uploader builds its client at import time.
+"""
+
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+UPLOADER = Path(__file__).resolve().parent.parent / 'docker/archive-uploader/archive_uploader.py'
+
+WINDOW = 900
+LADDER = ('sd', 'hd', 'fhd')
+STEADY_SWEEPS = 20
+SESSION = '1785710235'
+START = datetime(2026, 8, 2, 16, 0, tzinfo=timezone.utc)
+
+
+def load_uploader(work, uploads=False):
+    """Import the uploader pointed at `work`, which it reads its paths from at import."""
+    os.environ.update({
+        'HLS_PATH': str(work / 'live'),
+        'SOURCE_HLS_PATH': str(work / 'source'),
+        'INDEX_PATH': str(work / 'index'),
+        'MANIFEST_DB': str(work / 'manifest.sqlite'),
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+    })
+    spec = importlib.util.spec_from_file_location('archive_uploader', UPLOADER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not uploads:
+        # Uploads are not what is being measured, and there is no bucket to send them to.
+        module.dispatch_uploads = lambda manifest: None
+    return module
+
+
+def write_playlist(path, source, rendition, first, count):
+    """A sliding window as FFmpeg leaves it: PDT before every entry. The segments
+    exist, empty, since the uploader stats each one it records."""
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:6',
+        '#EXT-X-TARGETDURATION:2',
+        f'#EXT-X-MEDIA-SEQUENCE:{first}',
+    ]
+    for n in range(first, first + count):
+        pdt = START + timedelta(seconds=2 * n)
+        lines.append('#EXTINF:2.000000,')
+        lines.append(
+            '#EXT-X-PROGRAM-DATE-TIME:'
+            + pdt.strftime('%Y-%m-%dT%H:%M:%S.') + f'{pdt.microsecond // 1000:03d}+0000'
+        )
+        lines.append(f'{source}_{rendition}_{SESSION}_{n:06d}.ts')
+        segment = path.parent / lines[-1]
+        if not segment.exists():
+            segment.touch()
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def write_window(work, sources, first):
+    for i in range(sources):
+        source = f'bench{i:02d}'
+        (work / 'live' / f'{source}_master.m3u8').touch()
+        for rendition in LADDER:
+            write_playlist(work / 'live' / f'{source}_{rendition}.m3u8',
+                           source, rendition, first, WINDOW)
+        write_playlist(work / 'source' / f'{source}_source.m3u8',
+                       source, 'source', first, WINDOW)
+
+
+def bench_sweep(counts):
+    print(f'sweep, {WINDOW}-entry window, {len(LADDER)} renditions + source, no uploads')
+    for sources in counts:
+        with tempfile.TemporaryDirectory(prefix='uploader-bench-') as tmp:
+            work = Path(tmp)
+            (work / 'live').mkdir()
+            (work / 'source').mkdir()
+            uploader = load_uploader(work)
+            manifest = uploader.Manifest(str(work / 'manifest.sqlite'))
+            indexer = uploader.Indexer(manifest)
+
+            write_window(work, sources, 0)
+            began = time.perf_counter()
+            uploader.sweep(manifest, indexer)
+            cold = time.perf_counter() - began
+
+            steady = []
+            for step in range(1, STEADY_SWEEPS + 1):
+                write_window(work, sources, step)
+                began = time.perf_counter()
+                uploader.sweep(manifest, indexer)
+                steady.append(time.perf_counter() - began)
+
+            print(f'  {sources:3d} source(s)   cold {cold * 1000:8.1f} ms   '
+                  f'steady {statistics.median(steady) * 1000:8.1f} ms')
+
+
+def bench_index(runs=10):
+    print(f'index, {WINDOW}-entry backlog after a restart, ladder + source')
+    with tempfile.TemporaryDirectory(prefix='uploader-bench-') as tmp:
+        work = Path(tmp)
+        (work / 'live').mkdir()
+        (work / 'source').mkdir()
+        uploader = load_uploader(work)
+        write_window(work, 1, 0)
+        ladder, _ = uploader.parse_playlist(work / 'live' / 'bench00_hd.m3u8')
+        source, _ = uploader.parse_playlist(work / 'source' / 'bench00_source.m3u8')
+
+        took = []
+        for run in range(runs):
+            # A fresh manifest and index each time, so every entry is new.
+            manifest = uploader.Manifest(str(work / f'manifest-{run}.sqlite'))
+            uploader.INDEX_PATH = str(work / f'index-{run}')
+            indexer = uploader.Indexer(manifest)
+            began = time.perf_counter()
+            with manifest.batch():
+                indexer.add(ladder)
+                indexer.add_source(source, work / 'source')
+            took.append(time.perf_counter() - began)
+
+        print(f'  median {statistics.median(took) * 1000:.1f} ms   '
+              f'best {min(took) * 1000:.1f} ms   ({runs} runs)')
+
+
+ENGINES = (('spawn', 64), ('threads', 5), ('threads', 64), ('async', 64), ('async', 256))
+
+
+def spawn_dispatch(uploader, manifest, slots):
+    """dispatch_uploads() as it was before the upload pool: a thread per pending
+    segment not already in flight, each waiting on `slots` before it uploads."""
+    for path, key, *_ in manifest.pending_uploads():
+        with uploader.inflight_lock:
+            if path in uploader.inflight:
+                continue
+            uploader.inflight.add(path)
+        threading.Thread(
+            target=spawned_upload, args=(uploader, manifest, slots, path, key), daemon=True
+        ).start()
+
+
+def spawned_upload(uploader, manifest, slots, path, key):
+    try:
+        with slots:
+            uploader.upload_segment(manifest, path, key)
+    finally:
+        with uploader.inflight_lock:
+            uploader.inflight.discard(path)
+
+
+def bench_transfer(count, size):
+    if not os.environ.get('S3_ENDPOINT'):
+        print('transfer needs S3_ENDPOINT pointing at a local S3 stand-in')
+        return 1
+
+    bucket = f'uploader-bench-{int(time.time())}'
+    os.environ['S3_BUCKET'] = bucket
+    print(f'transfer, {count} x {size // 1024} KB segments, no rate cap')
+    for engine, concurrency in ENGINES:
+        with tempfile.TemporaryDirectory(prefix='uploader-bench-') as tmp:
+            work = Path(tmp)
+            (work / 'live').mkdir()
+            (work / 'source').mkdir()
+            os.environ.update({
+                'S3_ENGINE': engine,
+                'MAX_CONCURRENT_UPLOADS': str(concurrency),
+                'ASYNC_UPLOAD_CONCURRENCY': str(concurrency),
+            })
+            uploader = load_uploader(work, uploads=True)
+            try:
+                uploader.s3.create_bucket(
+                    Bucket=bucket,
+                    CreateBucketConfiguration={'LocationConstraint': uploader.S3_REGION},
+                )
+            except uploader.s3.exceptions.BucketAlreadyOwnedByYou:
+                pass
+
+            manifest = uploader.Manifest(str(work / 'manifest.sqlite'))
+            rows = []
+            for n in range(count):
+                name = f'bench00_hd_{SESSION}_{n:06d}.ts'
+                (work / 'live' / name).write_bytes(os.urandom(size))
+                rows.append((str(work / 'live' / name), f'bench/{engine}-{concurrency}/{name}',
+                             'bench00', time.time()))
+            manifest.record_pending_many(rows)
+
+            threads = threading.active_count()
+            cpu = time.process_time()
+            if engine == 'spawn':
+                slots = threading.Semaphore(concurrency)
+                dispatch = lambda: spawn_dispatch(uploader, manifest, slots)
+            else:
+                uploader.upload_pool.start(manifest)
+                dispatch = lambda: uploader.dispatch_uploads(manifest)
+            if engine != 'spawn' and uploader.upload_pool.engine != engine:
+                # Without aiobotocore the async engine falls back to threads, which
+                # would be timed and reported under the wrong name.
+                print(f'  {engine:7s} x{concurrency:<4d} unavailable, '
+                      f'{uploader.upload_pool.engine} started instead')
+                continue
+            began = time.perf_counter()
+            peak = 0
+            while manifest.pending_count():
+                # pending_uploads() hands out 500 at a time, as the sweep does.
+                dispatch()
+                peak = max(peak, threading.active_count() - threads)
+                time.sleep(0.05)
+            took = time.perf_counter() - began
+            cpu = time.process_time() - cpu
+
+            print(f'  {engine:7s} x{concurrency:<4d} {count / took:7.1f} segments/s   '
+                  f'{count * size * 8 / took / 1e6:7.1f} Mbps   {peak:4d} threads   '
+                  f'{cpu / (count * size / 1e9):6.1f} CPU s/GB   '
+                  f'failed {uploader.metrics["failed"]}')
+    return 0
+
+
+def main(argv):
+    if not argv or argv[0] not in ('sweep', 'index', 'transfer'):
+        print(__doc__.strip())
+        return 1
+
+    if argv[0] == 'index':
+        bench_index()
+        return 0
+
+    if argv[0] == 'transfer':
+        count = int(argv[1]) if len(argv) > 1 else 1000
+        size = int(argv[2]) * 1024 if len(argv) > 2 else 256 * 1024
+        return bench_transfer(count, size)
+
+    counts = [int(a) for a in argv[1:]] or [1, 5, 20]
+    bench_sweep(counts)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+How many activity log lines a second can the HLS session tracker keep up with?
+
+Runs the tracker's own code against a synthetic hls_activity log in a scratch
+directory, so it needs neither nginx nor the Laravel API.
+
+  ./scripts/bench-hls-tracker.py follow [lines]     reading the log, default 1M lines
+  ./scripts/bench-hls-tracker.py parse [lines|log]  parsing it into sessions
+  ./scripts/bench-hls-tracker.py report [sessions]  reporting to a stub API, default 5000
+  ./scripts/bench-hls-tracker.py api [requests]     HTTP client alone, default 5000
+
+Every viewer fetches a segment and its playlist per 2s segment, so a con at peak,
+5,000 viewers on one edge, logs about 5,000 lines a second. That is the rate each
+number here has to stay well clear of.
+
+`follow` reads the whole log once through the old `tail -F` pipe, one readline() at
+a time, and once through LogFollower, a block at a time, and reports lines per
+second for each, with the CPU time it took counting tail's own. Nothing is done
+with the lines, so this is the cost of getting them into the tracker and nothing
+more.
+
+`parse` feeds the same log, or a recorded one given as a path, through the
+tracker's session bookkeeping: once a line at a time as process_log_line() did
+before ActivityParser, and once in the batches LogFollower hands out. The log is
+read into memory first and session starts are not reported, so only parsing and
+bookkeeping are timed.
+
+`report` starts a stub of the API in-process that records what reaches it, and
+runs a con's worth of sessions through the tracker against it: each session
+starts, gets one heartbeat and ends, one CHECK_INTERVAL apart. It does this once
+with the stub advertising the batch endpoint and once without, and reports the
+requests and bytes each took, and whether every event arrived.
+
+`api` posts heartbeats to the same stub from the reporter's worker threads, once
+with requests.post() as the tracker did before ApiClient, a new connection each,
+and once through ApiClient's pooled keep-alive session, and reports requests per
+second and the latency the client saw.
+
+Needs requests importable, because the tracker imports it.
+"""
+
+import gzip
+import importlib.util
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+TRACKER = Path(__file__).resolve().parent / 'hls_session_tracker.py'
+
+STREAMS = ('prime', 'second', 'panel')
+QUALITIES = ('fhd', 'hd', 'sd')
+VIEWERS = 5000
+START = datetime(2026, 8, 2, 16, 0, tzinfo=timezone.utc)
+
+
+def load_tracker():
+    """Import the tracker without its log file, which only exists on an edge."""
+    # basicConfig() does nothing once the root logger has a handler, so the
+    # tracker's own call, with its FileHandler, is skipped.
+    logging.basicConfig(level=logging.WARNING)
+    spec = importlib.util.spec_from_file_location('hls_session_tracker', TRACKER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def activity_lines(count, start=START):
+    """Lines as the hls_activity log_format writes them, VIEWERS viewers at a time:
+    $remote_addr|$arg_session|$time_iso8601|$uri|$status|$arg_stream"""
+    rng = random.Random(1)
+    viewers = [
+        (f'203.0.{n // 256}.{n % 256}', f'{rng.getrandbits(64):016x}',
+         rng.choice(STREAMS), rng.choice(QUALITIES))
+        for n in range(VIEWERS)
+    ]
+    for n in range(count):
+        ip, session, stream, quality = viewers[n % VIEWERS]
+        at = (start + timedelta(seconds=n // VIEWERS)).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        if n // VIEWERS % 2:
+            uri = f'/hls/{stream}_{quality}.m3u8'
+        else:
+            uri = f'/hls/{stream}_{quality}/{n // VIEWERS:06d}.ts'
+        yield f'{ip}|{session}|{at}|{uri}|200|-\n'
+
+
+def write_log(path, count):
+    with open(path, 'w') as f:
+        f.writelines(activity_lines(count))
+
+
+def follow_tail(path, count):
+    """The tracker before LogFollower: tail -F into a text pipe, a line per readline()."""
+    p = subprocess.Popen(
+        ['tail', '-F', '-n', '+1', str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    seen = 0
+    try:
+        while seen < count:
+            if p.stdout.readline():
+                seen += 1
+    finally:
+        p.terminate()
+        p.wait()
+
+
+def follow_follower(tracker, path, count, work):
+    # A checkpoint at the start of the file, so it reads it all rather than
+    # starting at the end.
+    state = work / 'offset.json'
+    state.write_text(json.dumps({'inode': os.stat(path).st_ino, 'offset': 0}))
+    follower = tracker.LogFollower(str(path), str(state))
+    seen = 0
+    try:
+        while seen < count:
+            seen += len(follower.read_lines())
+            follower.commit()
+    finally:
+        follower.close()
+
+
+def process_per_line(tracker, session_info, line):
+    """process_log_line() as it was before ActivityParser, for comparison."""
+    parts = line.strip().split('|')
+    if len(parts) < 5:
+        return
+    ip, session_id, timestamp_str, uri, status = parts[:5]
+    stream = parts[5] if len(parts) > 5 else None
+    if not session_id or session_id == '-' or status != '200':
+        return
+    try:
+        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except ValueError:
+        timestamp = datetime.now()
+    quality = None
+    if (not stream or stream == '-') and '/' in uri:
+        path_parts = uri.split('/')
+        if len(path_parts) >= 3:
+            stream = path_parts[2].replace('.m3u8', '').replace('.ts', '')
+            for q in ['_fhd', '_hd', '_sd', '_ld']:
+                if q in stream:
+                    quality = q.replace('_', '')
+                    stream = stream.replace(q, '')
+                    break
+    with tracker.lock:
+        if session_id not in tracker.sessions:
+            tracker.session_started(session_id, ip, stream, timestamp)
+            tracker.sessions[session_id] = session_info(session_id, ip, stream, timestamp)
+        else:
+            tracker.sessions[session_id].update(timestamp, quality)
+        tracker.reported_ended.discard(session_id)
+
+
+def read_batches(tracker, path):
+    """The log as the batches LogFollower hands out, read ahead so reading is not timed."""
+    state = Path(tempfile.mkdtemp(prefix='tracker-bench-')) / 'offset.json'
+    state.write_text(json.dumps({'inode': os.stat(path).st_ino, 'offset': 0}))
+    follower = tracker.LogFollower(str(path), str(state))
+    batches = []
+    while True:
+        batch = follower.read_lines()
+        if not batch:
+            break
+        batches.append(batch)
+    follower.close()
+    return batches
+
+
+def bench_parse(source):
+    tracker_module = load_tracker()
+    with tempfile.TemporaryDirectory(prefix='tracker-bench-') as tmp:
+        log = Path(source) if not source.isdigit() else Path(tmp) / 'hls_activity.log'
+        if source.isdigit():
+            write_log(log, int(source))
+        batches = read_batches(tracker_module, log)
+    count = sum(len(batch) for batch in batches)
+    print(f'parse, {count:,} lines in {len(batches)} batches')
+
+    def per_line(tracker):
+        for batch in batches:
+            for line in batch:
+                process_per_line(tracker, tracker_module.SessionInfo, line)
+
+    def batched(tracker):
+        for batch in batches:
+            tracker.process_lines(batch)
+
+    for name, process in (('per line', per_line), ('batched', batched)):
+        tracker = tracker_module.HLSSessionTracker()
+        tracker.session_started = lambda *args: None
+        began = time.perf_counter()
+        process(tracker)
+        took = time.perf_counter() - began
+        print(f'  {name:12s} {count / took:12,.0f} lines/s   {took:6.2f} s   '
+              f'{len(tracker.sessions):,} sessions')
+
+
+def bench_follow(count):
+    tracker = load_tracker()
+    with tempfile.TemporaryDirectory(prefix='tracker-bench-') as tmp:
+        work = Path(tmp)
+        log = work / 'hls_activity.log'
+        write_log(log, count)
+        print(f'follow, {count:,} lines ({log.stat().st_size / 1e6:.0f} MB), '
+              f'{tracker.READ_BLOCK // 1024} KB blocks')
+
+        for name, follow in (
+            ('tail -F', lambda: follow_tail(log, count)),
+            ('LogFollower', lambda: follow_follower(tracker, log, count, work)),
+        ):
+            cpu = os.times()
+            began = time.perf_counter()
+            follow()
+            took = time.perf_counter() - began
+            cpu = sum(os.times()[:4]) - sum(cpu[:4])
+            print(f'  {name:12s} {count / took:12,.0f} lines/s   {took:6.2f} s   '
+                  f'{cpu / count * 1e6:5.2f} CPU s per million lines')
+
+
+class StubApi(ThreadingHTTPServer):
+    """The tracker's side of the API, counting requests, bytes and events received."""
+
+    daemon_threads = True
+
+    def __init__(self, batch):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.batch = batch
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.events = Counter()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/api/hls'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, a kept-alive
+    # connection waits on delayed ACKs for 40ms a response, as no real server does.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/api/hls/session/events' and self.server.batch:
+            self.reply(200, {'version': 1, 'max_events': 5000, 'gzip': True})
+        else:
+            self.reply(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        kinds = Counter()
+        kind = self.path.rsplit('/', 1)[1]
+        if kind == 'events' and self.server.batch:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            kinds.update(event['type'] for event in json.loads(body)['events'])
+        elif kind in ('start', 'heartbeat', 'end'):
+            json.loads(body)
+            kinds[kind] += 1
+        else:
+            self.reply(404, {'message': 'Not Found'})
+            return
+
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes += len(body) if 'Content-Encoding' not in self.headers else int(self.headers['Content-Length'])
+            self.server.events.update(kinds)
+        self.reply(200, {'status': 'ok'})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_report(sessions):
+    tracker_module = load_tracker()
+    print(f'report, {sessions:,} sessions: start, heartbeat, end')
+
+    for name, batch in (('per event', False), ('batched', True)):
+        api = StubApi(batch)
+        tracker_module.API_ENDPOINT = api.url
+        tracker = tracker_module.HLSSessionTracker()
+        tracker.reporter.start()
+
+        def delivered(expected):
+            while sum(api.events.values()) + sum(tracker.reporter.stats()['failed'].values()) < expected:
+                time.sleep(0.01)
+
+        # Timestamped now, so the sessions are live at the first check
+        lines = list(activity_lines(sessions, datetime.now(timezone.utc)))
+        began = time.perf_counter()
+        tracker.process_lines(lines)
+        tracker.reporter.flush()
+        delivered(sessions)
+        tracker.check_timeouts()
+        delivered(2 * sessions)
+        for session in tracker.sessions.values():
+            session.last_seen -= timedelta(seconds=tracker_module.SESSION_TIMEOUT + 1)
+        tracker.check_timeouts()
+        delivered(3 * sessions)
+        took = time.perf_counter() - began
+
+        tracker.reporter.stop()
+        api.shutdown()
+        print(f'  {name:10s} {api.requests:7,d} requests   {api.bytes / 1e6:6.2f} MB   '
+              f'{took:6.2f} s   received {dict(api.events)}')
+
+
+def bench_api(count):
+    tracker_module = load_tracker()
+    requests = tracker_module.requests
+    api = StubApi(batch=False)
+    tracker_module.API_ENDPOINT = api.url
+    workers = tracker_module.REPORT_WORKERS
+    payload = {'session': '0123456789abcdef', 'stream': 'prime',
+               'timestamp': START.isoformat(), 'segments_watched': 12}
+    headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    print(f'api, {count:,} heartbeats from {workers} threads')
+
+    def plain():
+        began = time.perf_counter()
+        requests.post(f'{api.url}/session/heartbeat', json=payload, headers=headers,
+                      timeout=5).raise_for_status()
+        return time.perf_counter() - began
+
+    client = tracker_module.ApiClient(headers)
+
+    def pooled():
+        began = time.perf_counter()
+        client.request('POST', 'session/heartbeat', json=payload, timeout=5).raise_for_status()
+        return time.perf_counter() - began
+
+    for name, post in (('requests.post', plain), ('ApiClient', pooled)):
+        latencies = []
+
+        def work(n):
+            latencies.extend(post() for _ in range(n))
+
+        threads = [threading.Thread(target=work, args=(count // workers,)) for _ in range(workers)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        took = time.perf_counter() - began
+        latencies.sort()
+        print(f'  {name:14s} {len(latencies) / took:8,.0f} req/s   '
+              f'p50 {latencies[len(latencies) // 2] * 1000:5.2f} ms   '
+              f'p95 {latencies[len(latencies) * 95 // 100] * 1000:5.2f} ms')
+
+    client.latency_summary()
+    api.shutdown()
+
+
+def main(argv):
+    if not argv or argv[0] not in ('follow', 'parse', 'report', 'api'):
+        print(__doc__.strip())
+        return 1
+
+    if argv[0] == 'api':
+        bench_api(int(argv[1]) if len(argv) > 1 else 5000)
+        return 0
+
+    if argv[0] == 'report':
+        bench_report(int(argv[1]) if len(argv) > 1 else 5000)
+        return 0
+
+    if argv[0] == 'parse':
+        bench_parse(argv[1] if len(argv) > 1 else '1000000')
+        return 0
+
+    count = int(argv[1]) if len(argv) > 1 else 1_000_000
+    bench_follow(count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
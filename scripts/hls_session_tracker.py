@@ -7,14 +7,18 @@ Tracks HLS session activity from NGINX logs and reports to Laravel backend
 import time
 import requests
 import json
-import subprocess
+import gzip
+import random
+import socket
 import threading
 import logging
 import os
+import queue
+import signal
 import sys
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Set, Optional
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict, deque
+from typing import Dict, List, Set, Optional, Tuple
 
 # Configuration
 ACTIVITY_LOG = os.getenv('HLS_ACTIVITY_LOG', '/var/log/nginx/hls_activity.log')
@@ -22,6 +26,14 @@ SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', '60'))  # seconds
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '10'))    # seconds
 API_ENDPOINT = os.getenv('API_ENDPOINT', 'http://localhost:8000/api/hls')
 API_KEY = os.getenv('API_KEY', '')  # Shared secret for API authentication
+STATE_FILE = os.getenv('HLS_TRACKER_STATE', '/var/lib/hls-tracker/offset.json')  # Where the log offset is checkpointed
+READ_BLOCK = int(os.getenv('READ_BLOCK', str(1 << 20)))  # bytes read from the log at a time
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '4'))  # threads posting events to the API
+REPORT_QUEUE_SIZE = int(os.getenv('REPORT_QUEUE_SIZE', '10000'))  # events waiting before new ones are dropped
+BATCH_PROBE_INTERVAL = int(os.getenv('BATCH_PROBE_INTERVAL', '300'))  # seconds between checks for the batch endpoint
+SERVER_ID = os.getenv('SERVER_ID', socket.gethostname())  # This edge, as the heartbeat endpoint knows it
+API_CONCURRENCY = int(os.getenv('API_CONCURRENCY', str(REPORT_WORKERS + 1)))  # requests to the API in flight at once
+API_RETRIES = int(os.getenv('API_RETRIES', '3'))  # attempts per request before it counts as failed
 
 # Logging setup
 logging.basicConfig(
@@ -72,6 +84,605 @@ class SessionInfo:
         }
 
 
+class LogFollower:
+    """
+    Follows the activity log in-process, in place of a `tail -F` subprocess.
+
+    Reads up to READ_BLOCK bytes at a time and hands back every complete line in them
+    together. Rotation shows as the path's inode changing: the old file is read to its
+    end through the descriptor still open on it before the new one is opened.
+    Truncation shows as the file shrinking below what has been read, and starts it over.
+
+    The offset of the last line the tracker has finished with is checkpointed to
+    STATE_FILE, so a restart resumes there rather than skipping what was logged while
+    the tracker was down. Without a checkpoint it starts at the end, as tail -n 0 did.
+    """
+
+    CHECKPOINT_INTERVAL = 1.0  # seconds between state file writes
+
+    def __init__(self, path: str, state_path: str, block_size: int = READ_BLOCK):
+        self.path = path
+        self.state_path = state_path
+        self.block_size = block_size
+        self.fd: Optional[int] = None
+        self.inode: Optional[int] = None
+        self.offset = 0        # end of the last complete line handed out
+        self.partial = b''     # bytes read past it, waiting for their newline
+        self.draining = False  # the path is a new file; read the old one once more first
+        self.done = None       # (inode, offset) the tracker has finished with
+        self.saved = None
+        self.last_checkpoint = 0.0
+        self.failing = False   # the last checkpoint failed, and said so
+
+    def open(self) -> bool:
+        """Open the log where the checkpoint left off. False if there is no log yet."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        # Reopening after an error goes back to what this run has processed, which
+        # the state file can be up to a CHECKPOINT_INTERVAL behind
+        if self.done:
+            state = {'inode': self.done[0], 'offset': self.done[1]}
+        else:
+            state = self._load_state()
+        path, offset = self.path, stat.st_size
+        if state:
+            if state['inode'] == stat.st_ino and state['offset'] <= stat.st_size:
+                offset = state['offset']
+            else:
+                # Rotated while we were down. If the old file is still beside it, finish
+                # that first; the new one is then read from its start as usual.
+                path, offset = self._rotated(state['inode']), state['offset']
+                if path is None:
+                    path, offset = self.path, 0
+
+        self._open(path, offset)
+        logger.info(f"Following {path} from byte {offset}")
+        return True
+
+    def read_lines(self) -> List[str]:
+        """The complete lines in the next block of the log; empty when caught up"""
+        if self.fd is None and not self.open():
+            return []
+
+        data = os.read(self.fd, self.block_size)
+        if not data:
+            self._check_rotation()
+            return []
+
+        data = self.partial + data
+        end = data.rfind(b'\n') + 1
+        self.partial = data[end:]
+        self.offset += end
+        return data[:end].decode('utf-8', 'replace').splitlines()
+
+    def commit(self) -> None:
+        """Mark every line handed out so far as processed, and checkpoint at most once a second"""
+        self.done = (self.inode, self.offset)
+        self.checkpoint()
+
+    def checkpoint(self, force: bool = False) -> None:
+        """
+        Write the processed offset to the state file, atomically, if it has moved.
+
+        At most once a CHECKPOINT_INTERVAL unless forced, which also paces retries
+        after a failure; a failure is logged once, not on every retry.
+        """
+        if self.done is None or self.done == self.saved:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_checkpoint < self.CHECKPOINT_INTERVAL:
+            return
+        self.last_checkpoint = now
+
+        inode, offset = self.done
+        tmp = f"{self.state_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump({'inode': inode, 'offset': offset}, f)
+            os.replace(tmp, self.state_path)
+            self.saved = self.done
+            if self.failing:
+                logger.info(f"Checkpointing log offset to {self.state_path} again")
+                self.failing = False
+        except OSError as e:
+            if not self.failing:
+                logger.warning(f"Failed to checkpoint log offset, will keep trying: {e}")
+                self.failing = True
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _open(self, path: str, offset: int) -> None:
+        self.close()
+        self.fd = os.open(path, os.O_RDONLY)
+        self.inode = os.fstat(self.fd).st_ino
+        os.lseek(self.fd, offset, os.SEEK_SET)
+        self.offset = offset
+        self.partial = b''
+        self.draining = False
+        # Nothing before where reading starts is left to process
+        self.done = (self.inode, offset)
+
+    def _check_rotation(self) -> None:
+        """At the end of the open file: move to a rotated-in log, or start a truncated one over"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return  # Mid-rotation; the new file will appear
+
+        if stat.st_ino != self.inode:
+            # Nginx workers each reopen the log on their own after logrotate signals
+            # them, so one may still be writing to the old file. Once the new one has
+            # data, read the old one once more and only then move on.
+            if stat.st_size == 0:
+                return
+            if not self.draining:
+                self.draining = True
+                return
+            if self.partial:
+                logger.warning(f"Dropping {len(self.partial)} bytes without a newline at the end of the rotated log")
+            logger.info(f"Log rotated, following the new {self.path}")
+            self._open(self.path, 0)
+        elif stat.st_size < self.offset + len(self.partial):
+            logger.info(f"Log truncated, reading {self.path} from the start")
+            self._open(self.path, 0)
+
+    def _rotated(self, inode: int) -> Optional[str]:
+        """The rotated-away log with this inode, if logrotate has left it uncompressed"""
+        directory = os.path.dirname(self.path) or '.'
+        name = os.path.basename(self.path)
+        for candidate in sorted(n for n in os.listdir(directory) if n.startswith(f"{name}.")):
+            path = os.path.join(directory, candidate)
+            try:
+                if os.stat(path).st_ino == inode:
+                    return path
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _load_state(self) -> Optional[dict]:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            return {'inode': int(state['inode']), 'offset': int(state['offset'])}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.state_path}: {e}")
+            return None
+
+
+class ActivityParser:
+    """
+    Parses the hls_activity log format a batch of lines at a time:
+    $remote_addr|$arg_session|$time_iso8601|$uri|$status|$arg_stream
+
+    Every viewer on an edge logs within the same few seconds and fetches one of a
+    handful of playlists, so a batch repeats the same timestamps and URIs thousands of
+    times. Each distinct timestamp and URI is parsed once and the result
+    reused, which also means every session on a stream shares one interned string for
+    its name and quality.
+    """
+
+    QUALITIES = ['_fhd', '_hd', '_sd', '_ld']
+    CACHE_LIMIT = 4096  # distinct values kept before a cache starts over
+
+    def __init__(self):
+        self.timestamps: Dict[str, datetime] = {}
+        self.streams: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def parse(self, lines: List[str]) -> List[Tuple[str, str, Optional[str], datetime, Optional[str]]]:
+        """
+        (session, ip, stream, timestamp, quality) for each line that counts as viewing.
+        A line that cannot be parsed is logged and skipped, and costs only itself.
+        """
+        events = []
+        timestamps, streams = self.timestamps, self.streams
+        for line in lines:
+            try:
+                parts = line.strip().split('|')
+                if len(parts) < 5:
+                    continue
+
+                ip, session_id, timestamp_str, uri, status = parts[:5]
+                stream = parts[5] if len(parts) > 5 else None
+
+                # Skip invalid entries
+                if not session_id or session_id == '-' or status != '200':
+                    continue
+
+                timestamp = timestamps.get(timestamp_str) or self.timestamp(timestamp_str)
+
+                # nginx logs a request without ?stream= as '-'; take it from the URI instead
+                quality = None
+                if not stream or stream == '-':
+                    stream, quality = streams.get(uri) or self.stream(uri)
+            except Exception as e:
+                logger.error(f"Error processing log line {line!r}: {e}")
+                continue
+
+            events.append((session_id, ip, stream, timestamp, quality))
+        return events
+
+    def timestamp(self, value: str) -> datetime:
+        """Parse a timestamp not seen before, keeping it for the lines that repeat it"""
+        try:
+            timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return datetime.now(timezone.utc)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        if len(self.timestamps) >= self.CACHE_LIMIT:
+            self.timestamps.clear()
+        self.timestamps[value] = timestamp
+        return timestamp
+
+    def stream(self, uri: str) -> Tuple[Optional[str], Optional[str]]:
+        """Stream name and quality from a URI not seen before, e.g. /hls/prime_hd.m3u8"""
+        stream = quality = None
+        if '/' in uri:
+            path_parts = uri.split('/')
+            if len(path_parts) >= 3:
+                # Remove file extensions
+                stream = path_parts[2].replace('.m3u8', '').replace('.ts', '')
+
+                # Extract quality if present
+                for q in self.QUALITIES:
+                    if q in stream:
+                        quality = sys.intern(q.replace('_', ''))
+                        stream = stream.replace(q, '')
+                        break
+                stream = sys.intern(stream)
+
+        if len(self.streams) >= self.CACHE_LIMIT:
+            self.streams.clear()
+        self.streams[uri] = (stream, quality)
+        return stream, quality
+
+
+class ApiClient:
+    """
+    One pooled, keep-alive session for every call to the API.
+
+    requests.post() opens a connection per call, and a TLS handshake with it for an
+    https API_ENDPOINT. This keeps up to API_CONCURRENCY connections open and never
+    has more requests than that in flight. A request that cannot connect, times out
+    or gets a 429 or 5xx gateway error is tried again, up to API_RETRIES times, after
+    an exponential backoff with full jitter, so that edges which lost the API
+    together do not come back in step. The API treats repeated events as the same
+    event (see docs/hls-session-events.md), so POSTs retry too.
+
+    Latency is kept per endpoint, and latency_summary() reports it since the last
+    call.
+    """
+
+    RETRY_STATUSES = {429, 502, 503, 504}
+    BACKOFF_BASE = 0.5  # seconds
+    BACKOFF_CAP = 5.0   # seconds
+
+    def __init__(self, headers: Dict[str, str], concurrency: int = API_CONCURRENCY, retries: int = API_RETRIES):
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.retries = max(1, retries)
+        self.stats_lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def request(self, method: str, path: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """Send a request to API_ENDPOINT/path, retrying what is worth retrying"""
+        attempts = retries or self.retries
+        for attempt in range(attempts):
+            began = time.monotonic()
+            try:
+                with self.slots:
+                    response = self.session.request(method, f"{API_ENDPOINT}/{path}", **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.record(path, time.monotonic() - began, failed=True)
+                if attempt + 1 == attempts:
+                    raise
+            else:
+                retry = response.status_code in self.RETRY_STATUSES
+                self.record(path, time.monotonic() - began, failed=retry)
+                if not retry or attempt + 1 == attempts:
+                    return response
+            time.sleep(random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt)))
+
+    def record(self, path: str, seconds: float, failed: bool = False) -> None:
+        with self.stats_lock:
+            self.latencies[path].append(seconds)
+            if failed:
+                self.errors[path] += 1
+
+    def latency_summary(self) -> str:
+        """Calls, retryable failures and latency per endpoint since the last summary"""
+        with self.stats_lock:
+            latencies, self.latencies = self.latencies, defaultdict(list)
+            errors, self.errors = self.errors, defaultdict(int)
+
+        summaries = []
+        for path, times in sorted(latencies.items()):
+            times.sort()
+            p50 = times[len(times) // 2] * 1000
+            p95 = times[min(len(times) - 1, len(times) * 95 // 100)] * 1000
+            summaries.append(
+                f"{path} {len(times)} calls, {errors[path]} failed, "
+                f"p50 {p50:.0f}ms, p95 {p95:.0f}ms, max {times[-1] * 1000:.0f}ms"
+            )
+        return '; '.join(summaries)
+
+
+class Reporter:
+    """
+    Posts session events to the API from worker threads.
+
+    The tracker only queues events, so a slow or unreachable API never holds up
+    reading the log or checking timeouts. When the queue is full, new events are
+    dropped and counted rather than waited for. Heartbeats are dropped first, once
+    the queue is half full: one that is lost is followed by the next a
+    CHECK_INTERVAL later, while a lost start or end is not.
+
+    When the API advertises the batch endpoint (see docs/hls-session-events.md),
+    everything queued is sent once a CHECK_INTERVAL as one gzipped request, and the
+    workers sit idle. Heartbeats then bypass the queue: only the latest per session
+    is kept until the batch goes, so every active session gets one per interval
+    however many sessions there are. Otherwise, or once the endpoint goes away, the workers post
+    each event to its own endpoint as before. Support is probed again every
+    BATCH_PROBE_INTERVAL, so an API that gains the endpoint is picked up without a
+    restart.
+    """
+
+    PATHS = {
+        'start': 'session/start',
+        'heartbeat': 'session/heartbeat',
+        'end': 'session/end',
+    }
+    BATCH_PATH = 'session/events'
+
+    def __init__(self, headers: Dict[str, str], workers: int = REPORT_WORKERS, size: int = REPORT_QUEUE_SIZE):
+        self.api = ApiClient(headers)
+        self.queue: queue.Queue = queue.Queue(maxsize=size)
+        self.counts_lock = threading.Lock()
+        self.sent: Dict[str, int] = defaultdict(int)
+        self.failed: Dict[str, int] = defaultdict(int)
+        self.dropped: Dict[str, int] = defaultdict(int)
+        self.batches = 0
+        self.workers = [
+            threading.Thread(target=self.work, name=f"reporter-{n}", daemon=True)
+            for n in range(workers)
+        ]
+
+        # Batch endpoint state, as the last probe found it
+        self.batch: Optional[dict] = None
+        self.heartbeats_lock = threading.Lock()
+        self.heartbeats: Dict[str, dict] = {}  # session -> latest heartbeat, while batching
+        self.probed_at: Optional[float] = None  # monotonic time of the last probe; None before the first
+        self.per_event = threading.Event()  # set while events go one request each
+        # Events a worker took just as batching began, for the batcher to send first.
+        # The lock orders handing one back against switching to per-event requests.
+        self.mode_lock = threading.Lock()
+        self.returned: deque = deque()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.batcher = threading.Thread(target=self.batch_loop, name="reporter-batch", daemon=True)
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        self.batcher.start()
+
+    def submit(self, kind: str, payload: dict) -> None:
+        """Queue an event for the API, without waiting"""
+        if kind != 'start':
+            with self.heartbeats_lock:
+                if kind == 'end':
+                    # The end carries last_seen; a heartbeat after it would be stale
+                    self.heartbeats.pop(payload['session'], None)
+                elif self.batch is not None:
+                    self.heartbeats[payload['session']] = payload
+                    return
+
+        # Heartbeats stop at half the queue, leaving room for starts and ends
+        if kind == 'heartbeat' and self.queue.qsize() >= self.queue.maxsize // 2:
+            self.count(self.dropped, kind)
+            return
+        try:
+            self.queue.put_nowait((kind, payload))
+        except queue.Full:
+            self.count(self.dropped, kind)
+
+    def flush(self) -> None:
+        """Send what is queued now rather than at the end of the interval"""
+        self.wake.set()
+
+    def work(self) -> None:
+        while True:
+            self.per_event.wait()
+            event = self.queue.get()
+            if event is None:
+                return
+            # Batching may have begun while this worker waited in get()
+            with self.mode_lock:
+                if not self.per_event.is_set():
+                    self.returned.append(event)
+                    continue
+            kind, payload = event
+            try:
+                response = self.api.request('POST', self.PATHS[kind], json=payload, timeout=5)
+                response.raise_for_status()
+                self.count(self.sent, kind)
+            except Exception as e:
+                self.count(self.failed, kind)
+                # A heartbeat is replaced by the next one; starts and ends are not
+                log = logger.debug if kind == 'heartbeat' else logger.error
+                log(f"Failed to report session {kind}: {e}")
+
+    def probe_due(self) -> bool:
+        """Whether to ask about the batch endpoint now: at start, then every BATCH_PROBE_INTERVAL while it is off"""
+        if self.batch is not None:
+            return False
+        return self.probed_at is None or time.monotonic() - self.probed_at >= BATCH_PROBE_INTERVAL
+
+    def batch_loop(self) -> None:
+        while True:
+            try:
+                if self.probe_due():
+                    self.probe()
+                if self.batch is not None:
+                    self.send_batches()
+            except Exception as e:
+                logger.error(f"Error sending batch: {e}")
+            if self.stopping:
+                return
+            self.wake.wait(CHECK_INTERVAL)
+            self.wake.clear()
+
+    def probe(self) -> None:
+        """Ask the API whether it takes batches, and switch to whichever way it does"""
+        self.probed_at = time.monotonic()
+        try:
+            response = self.api.request('GET', self.BATCH_PATH, retries=1, timeout=5)
+            response.raise_for_status()
+            batch = response.json()
+            if not isinstance(batch, dict) or batch.get('version') != 1:
+                raise ValueError(f"unsupported batch contract {batch!r}")
+        except Exception as e:
+            logger.info(f"Batch endpoint unavailable, reporting each event on its own: {e}")
+            self.report_per_event()
+            return
+
+        self.batch = batch
+        logger.info(f"Reporting events in batches of up to {self.batch_size()}")
+        self.per_event.clear()
+
+    def report_per_event(self) -> None:
+        """Wake the workers, with anything handed back to the batcher queued for them"""
+        with self.mode_lock:
+            self.per_event.set()
+            returned, self.returned = self.returned, deque()
+        for event in returned:
+            self.queue.put(event)
+
+    def batch_size(self) -> int:
+        return max(1, int(self.batch.get('max_events', 5000)))
+
+    def send_batches(self) -> None:
+        """Send everything queued, as few requests as the API's batch limit allows"""
+        while self.batch is not None:
+            size = self.batch_size()
+            events = []
+            while len(events) < size and self.returned:
+                events.append(self.returned.popleft())
+            while len(events) < size:
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    # A worker's stop marker; leave it for the worker
+                    self.queue.put(None)
+                    break
+                events.append(event)
+            if len(events) < size:
+                # Heartbeats after everything queued before them
+                with self.heartbeats_lock:
+                    sessions = list(self.heartbeats)[:size - len(events)]
+                    events += [('heartbeat', self.heartbeats.pop(session)) for session in sessions]
+            if not events:
+                return
+            self.send_batch(events)
+            if len(events) < size:
+                return
+
+    def send_batch(self, events: List[Tuple[str, dict]]) -> None:
+        body = json.dumps({
+            'server_id': SERVER_ID,
+            'sent_at': datetime.now(timezone.utc).isoformat(),
+            'events': [{'type': kind, **payload} for kind, payload in events],
+        }).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.batch.get('gzip'):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+        kinds = defaultdict(int)
+        for kind, _ in events:
+            kinds[kind] += 1
+        try:
+            response = self.api.request('POST', self.BATCH_PATH, data=body, headers=headers, timeout=15)
+            if response.status_code in (404, 405, 415):
+                # The endpoint has gone; send these one at a time and look again later
+                logger.warning(f"Batch endpoint returned {response.status_code}, reporting each event on its own")
+                with self.heartbeats_lock:
+                    self.batch = None
+                    heartbeats, self.heartbeats = self.heartbeats, {}
+                self.report_per_event()
+                for event in events:
+                    self.queue.put(event)
+                for payload in heartbeats.values():
+                    self.submit('heartbeat', payload)
+                return
+            response.raise_for_status()
+            with self.counts_lock:
+                self.batches += 1
+                for kind, n in kinds.items():
+                    self.sent[kind] += n
+        except Exception as e:
+            with self.counts_lock:
+                for kind, n in kinds.items():
+                    self.failed[kind] += n
+            logger.error(f"Failed to report batch of {len(events)} events: {e}")
+
+    def count(self, counter: Dict[str, int], kind: str) -> None:
+        with self.counts_lock:
+            counter[kind] += 1
+
+    def stats(self) -> dict:
+        """Queue depth, batches sent, and events sent, failed and dropped so far by kind"""
+        with self.counts_lock:
+            return {
+                'queued': self.queue.qsize() + len(self.heartbeats) + len(self.returned),
+                'batches': self.batches,
+                'sent': dict(self.sent),
+                'failed': dict(self.failed),
+                'dropped': dict(self.dropped),
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        totals = {key: sum(stats[key].values()) for key in ('sent', 'failed', 'dropped')}
+        return (f"report queue: {stats['queued']}, sent: {totals['sent']}, "
+                f"failed: {totals['failed']}, dropped: {totals['dropped']}")
+
+    def stop(self, timeout: float = 10) -> None:
+        """Send what is already queued, for up to `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        self.stopping = True
+        self.wake.set()
+        self.batcher.join(timeout=max(0, deadline - time.monotonic()))
+
+        # Whatever the batcher left goes one event at a time
+        self.report_per_event()
+        try:
+            for _ in self.workers:
+                self.queue.put(None, timeout=max(0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        for worker in self.workers:
+            worker.join(timeout=max(0, deadline - time.monotonic()))
+        if self.queue.qsize():
+            logger.warning(f"Shut down with {self.queue.qsize()} events unreported")
+
+
 class HLSSessionTracker:
     """Main tracker class for HLS sessions"""
     
@@ -80,84 +691,55 @@ class HLSSessionTracker:
         self.reported_ended: Set[str] = set()
         self.lock = threading.Lock()
         self.running = True
+        self.parser = ActivityParser()
+        self.follower = LogFollower(ACTIVITY_LOG, STATE_FILE)
+        self.tail_thread: Optional[threading.Thread] = None
         self.api_headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
         if API_KEY:
             self.api_headers['X-API-Key'] = API_KEY
+        self.reporter = Reporter(self.api_headers)
+        self.dropped_logged = 0
     
     def process_log_line(self, line: str) -> None:
         """Process a single log line from NGINX"""
-        try:
-            # Parse log format: $remote_addr|$arg_session|$time_iso8601|$uri|$status|$arg_stream
-            parts = line.strip().split('|')
-            if len(parts) < 5:
-                return
-                
-            ip, session_id, timestamp_str, uri, status = parts[:5]
-            stream = parts[5] if len(parts) > 5 else None
-            
-            # Skip invalid entries
-            if not session_id or session_id == '-' or status != '200':
-                return
-            
-            # Parse timestamp
-            try:
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            except:
-                timestamp = datetime.now()
-            
-            # Extract stream name and quality from URI
-            if not stream and '/' in uri:
-                path_parts = uri.split('/')
-                if len(path_parts) >= 3:
-                    stream_part = path_parts[2]
-                    # Remove file extensions
-                    stream = stream_part.replace('.m3u8', '').replace('.ts', '')
-                    
-                    # Extract quality if present
-                    quality = None
-                    for q in ['_fhd', '_hd', '_sd', '_ld']:
-                        if q in stream:
-                            quality = q.replace('_', '')
-                            stream = stream.replace(q, '')
-                            break
-            
-            with self.lock:
-                # New session?
-                if session_id not in self.sessions:
-                    self.session_started(session_id, ip, stream, timestamp)
-                    self.sessions[session_id] = SessionInfo(session_id, ip, stream, timestamp)
-                else:
-                    # Update existing session
-                    self.sessions[session_id].update(timestamp, quality if 'quality' in locals() else None)
-                
-                # Remove from ended list if it's back
-                self.reported_ended.discard(session_id)
-                
-        except Exception as e:
-            logger.error(f"Error processing log line: {e}")
+        self.process_lines([line])
+
+    def process_lines(self, lines: List[str]) -> None:
+        """
+        Process a batch of log lines from NGINX, under one acquisition of the lock.
+        As with one line at a time, a line that fails is logged and the rest go on.
+        """
+        events = self.parser.parse(lines)
+
+        with self.lock:
+            for session_id, ip, stream, timestamp, quality in events:
+                try:
+                    session = self.sessions.get(session_id)
+                    # New session?
+                    if session is None:
+                        self.session_started(session_id, ip, stream, timestamp)
+                        self.sessions[session_id] = SessionInfo(session_id, ip, stream, timestamp)
+                    else:
+                        # Update existing session
+                        session.update(timestamp, quality)
+
+                    # Remove from ended list if it's back
+                    self.reported_ended.discard(session_id)
+                except Exception as e:
+                    logger.error(f"Error processing log line for session {session_id}: {e}")
     
     def session_started(self, session_id: str, ip: str, stream: str, timestamp: datetime) -> None:
         """Report new session start to API"""
         logger.info(f"Session started: {session_id} from {ip} watching {stream}")
-        
-        try:
-            response = requests.post(
-                f"{API_ENDPOINT}/session/start",
-                json={
-                    'session': session_id,
-                    'ip': ip,
-                    'stream': stream,
-                    'timestamp': timestamp.isoformat()
-                },
-                headers=self.api_headers,
-                timeout=5
-            )
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Failed to report session start: {e}")
+        self.reporter.submit('start', {
+            'session': session_id,
+            'ip': ip,
+            'stream': stream,
+            'timestamp': timestamp.isoformat()
+        })
     
     def session_ended(self, session: SessionInfo) -> None:
         """Report session end to API"""
@@ -165,40 +747,21 @@ class HLSSessionTracker:
             return
             
         logger.info(f"Session ended: {session.session_id} (duration: {session.duration_seconds:.0f}s, segments: {session.segments_watched})")
-        
-        try:
-            response = requests.post(
-                f"{API_ENDPOINT}/session/end",
-                json=session.to_dict(),
-                headers=self.api_headers,
-                timeout=5
-            )
-            response.raise_for_status()
-            self.reported_ended.add(session.session_id)
-        except Exception as e:
-            logger.error(f"Failed to report session end: {e}")
+        self.reporter.submit('end', session.to_dict())
+        self.reported_ended.add(session.session_id)
     
     def heartbeat(self, session: SessionInfo) -> None:
         """Send heartbeat for active session"""
-        try:
-            response = requests.post(
-                f"{API_ENDPOINT}/session/heartbeat",
-                json={
-                    'session': session.session_id,
-                    'stream': session.stream,
-                    'timestamp': session.last_seen.isoformat(),
-                    'segments_watched': session.segments_watched
-                },
-                headers=self.api_headers,
-                timeout=5
-            )
-            response.raise_for_status()
-        except Exception as e:
-            logger.debug(f"Failed to send heartbeat: {e}")
+        self.reporter.submit('heartbeat', {
+            'session': session.session_id,
+            'stream': session.stream,
+            'timestamp': session.last_seen.isoformat(),
+            'segments_watched': session.segments_watched
+        })
     
     def check_timeouts(self) -> None:
         """Check for timed out sessions"""
-        now = datetime.now()
+        now = datetime.now(timezone.utc)
         timeout_threshold = now - timedelta(seconds=SESSION_TIMEOUT)
         
         with self.lock:
@@ -224,46 +787,53 @@ class HLSSessionTracker:
             
             # Log statistics
             if len(self.sessions) > 0 or len(timed_out) > 0:
-                logger.info(f"Active sessions: {len(self.sessions)}, Timed out: {len(timed_out)}")
+                logger.info(f"Active sessions: {len(self.sessions)}, Timed out: {len(timed_out)}, {self.reporter.summary()}")
+
+        # Ends and heartbeats go out now, in one batch where the API takes them
+        self.reporter.flush()
+
+        dropped = sum(self.reporter.stats()['dropped'].values())
+        if dropped > self.dropped_logged:
+            logger.warning(f"Report queue full, dropped {dropped - self.dropped_logged} events since the last check")
+            self.dropped_logged = dropped
+
+        latency = self.reporter.api.latency_summary()
+        if latency:
+            logger.info(f"API latency: {latency}")
     
     def tail_log(self) -> None:
-        """Tail the NGINX log file and process new lines"""
-        logger.info(f"Starting to tail log file: {ACTIVITY_LOG}")
-        
-        # Wait for log file to exist
-        while not os.path.exists(ACTIVITY_LOG) and self.running:
-            logger.warning(f"Log file {ACTIVITY_LOG} not found, waiting...")
-            time.sleep(5)
-        
-        try:
-            # Start tailing from end of file
-            p = subprocess.Popen(
-                ['tail', '-F', '-n', '0', ACTIVITY_LOG],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            
-            while self.running:
-                line = p.stdout.readline()
-                if line:
-                    self.process_log_line(line)
-                else:
-                    time.sleep(0.1)
-                    
-        except Exception as e:
-            logger.error(f"Error tailing log: {e}")
-        finally:
-            if 'p' in locals():
-                p.terminate()
-    
+        """Follow the NGINX log and process new lines a block at a time"""
+        logger.info(f"Starting to follow log file: {ACTIVITY_LOG}")
+
+        while self.running:
+            try:
+                lines = self.follower.read_lines()
+            except Exception as e:
+                logger.error(f"Error reading log: {e}")
+                self.follower.close()
+                time.sleep(5)
+                continue
+
+            if lines:
+                self.process_lines(lines)
+                self.follower.commit()
+            elif self.follower.fd is None:
+                # Wait for log file to exist
+                logger.warning(f"Log file {ACTIVITY_LOG} not found, waiting...")
+                time.sleep(5)
+            else:
+                self.follower.checkpoint()
+                time.sleep(0.1)
+
     def run(self) -> None:
         """Main loop"""
         logger.info(f"Starting HLS session tracker (timeout: {SESSION_TIMEOUT}s, check interval: {CHECK_INTERVAL}s)")
         
+        self.reporter.start()
+
         # Start log tailing in background thread
-        tail_thread = threading.Thread(target=self.tail_log, daemon=True)
-        tail_thread.start()
+        self.tail_thread = threading.Thread(target=self.tail_log, daemon=True)
+        self.tail_thread.start()
         
         # Check for timeouts periodically
         try:
@@ -277,11 +847,17 @@ class HLSSessionTracker:
     def shutdown(self) -> None:
         """Clean shutdown"""
         self.running = False
+
+        # Let the current batch finish, then record how far it got
+        if self.tail_thread:
+            self.tail_thread.join(timeout=5)
+        self.follower.checkpoint(force=True)
         
         # Report all remaining sessions as ended
         with self.lock:
             for session in self.sessions.values():
                 self.session_ended(session)
+        self.reporter.stop()
         
         logger.info("Tracker shut down")
 
@@ -293,6 +869,9 @@ def main():
         logger.error("API_ENDPOINT environment variable not set")
         sys.exit(1)
     
+    # systemd stops the tracker with SIGTERM; shut down as for Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
     # Create and run tracker
     tracker = HLSSessionTracker()
     
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Checks for the archive uploader: its playlist follower, its manifest's in-memory
+sets, and its upload engines against moto's S3 server.
+
+  python3 -m unittest scripts/test_archive_uploader.py
+
+Needs boto3 importable. The engine checks also need moto, and the async engine's
+aiobotocore; each is skipped without them.
+"""
+
+import hashlib
+import importlib.util
+import itertools
+import logging
+import os
+import random
+import socket
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+try:
+    import aiobotocore  # noqa: F401
+    HAVE_AIOBOTOCORE = True
+except ImportError:
+    HAVE_AIOBOTOCORE = False
+
+UPLOADER = Path(__file__).resolve().parent.parent / 'docker/archive-uploader/archive_uploader.py'
+SESSION = '1785710235'
+buckets = itertools.count()
+server = endpoint = None
+
+
+def setUpModule():
+    global server, endpoint
+    if ThreadedMotoServer is None:
+        return
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    endpoint = f'http://127.0.0.1:{port}'
+
+
+def tearDownModule():
+    if server:
+        server.stop()
+
+
+def load(**settings):
+    """The uploader, imported afresh with `settings`, and a work directory for it."""
+    work = Path(tempfile.mkdtemp(prefix='uploader-test-'))
+    (work / 'live').mkdir()
+    env = {
+        'S3_ENDPOINT': endpoint or 'http://127.0.0.1:9',
+        'S3_ACCESS_KEY': 'test',
+        'S3_SECRET_KEY': 'test',
+        'S3_BUCKET': f'uploader-test-{next(buckets)}',
+        'HLS_PATH': str(work / 'live'),
+        'SOURCE_HLS_PATH': str(work / 'live'),
+        'INDEX_PATH': str(work / 'index'),
+        'MANIFEST_DB': str(work / 'manifest.sqlite'),
+        'LOG_LEVEL': 'CRITICAL',
+        **settings,
+    }
+    with mock.patch.dict(os.environ, env):
+        spec = importlib.util.spec_from_file_location('archive_uploader', UPLOADER)
+        uploader = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(uploader)
+    return uploader, work
+
+
+@unittest.skipIf(ThreadedMotoServer is None, 'needs moto')
+class EngineTests:
+    """What either engine has to do with a backlog. ENGINE is set by the subclass."""
+
+    ENGINE = None
+
+    def load(self, **settings):
+        """The uploader, imported afresh with `settings`, and a manifest for it."""
+        uploader, work = load(S3_ENGINE=self.ENGINE, **settings)
+        uploader.s3.create_bucket(
+            Bucket=uploader.S3_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': uploader.S3_REGION},
+        )
+        return uploader, work, uploader.Manifest(str(work / 'manifest.sqlite'))
+
+    def backlog(self, uploader, work, manifest, count, size):
+        """`count` segments of `size` random bytes, pending. Returns their paths."""
+        paths, rows = [], []
+        for n in range(count):
+            path = work / 'live' / f'test_hd_{SESSION}_{n:06d}.ts'
+            path.write_bytes(os.urandom(size))
+            paths.append(path)
+            rows.append((str(path), f'archive/test/{path.name}', 'test', time.time()))
+        manifest.record_pending_many(rows)
+        return paths
+
+    def run_uploads(self, uploader, manifest, done, timeout=30):
+        """Start the engine and dispatch until done(), returning the seconds it took."""
+        uploader.upload_pool.start(manifest)
+        self.assertEqual(uploader.upload_pool.engine, self.ENGINE)
+        began = time.perf_counter()
+        while not done():
+            self.assertLess(time.perf_counter() - began, timeout, 'uploads did not finish')
+            uploader.dispatch_uploads(manifest)
+            time.sleep(0.05)
+        return time.perf_counter() - began
+
+    def test_uploads_are_verified(self):
+        uploader, work, manifest = self.load()
+        paths = self.backlog(uploader, work, manifest, 20, 64 * 1024)
+
+        self.run_uploads(uploader, manifest, lambda: manifest.pending_count() == 0)
+
+        for path in paths:
+            head = uploader.s3.head_object(Bucket=uploader.S3_BUCKET, Key=f'archive/test/{path.name}')
+            self.assertEqual(head['ETag'].strip('"'), hashlib.md5(path.read_bytes()).hexdigest())
+        self.assertEqual(uploader.metrics['verified'], len(paths))
+        self.assertEqual(uploader.metrics['failed'], 0)
+
+    def test_a_size_mismatch_is_not_verified(self):
+        # With UPLOAD_VERIFY=head the PUT proves nothing, so each upload is
+        # confirmed by a HEAD, here one reporting a byte more than was sent.
+        uploader, work, manifest = self.load(UPLOAD_VERIFY='head')
+        self.backlog(uploader, work, manifest, 5, 16 * 1024)
+
+        def longer(parsed, **kwargs):
+            parsed['ContentLength'] += 1
+
+        uploader.s3.meta.events.register('after-call.s3.HeadObject', longer)
+        create = uploader.AsyncUploadEngine.create
+
+        def create_with_hook(pool, concurrency):
+            engine = create(pool, concurrency)
+            if engine:
+                engine.session.register('after-call.s3.HeadObject', longer)
+            return engine
+
+        with mock.patch.object(uploader.AsyncUploadEngine, 'create', create_with_hook):
+            self.run_uploads(uploader, manifest, lambda: uploader.metrics['failed'] >= 5)
+
+        self.assertEqual(manifest.pending_count(), 5)
+        self.assertEqual(uploader.metrics['verified'], 0)
+
+    def test_uploads_hold_to_the_rate_cap(self):
+        # 100 KB/s, with a second's burst: 768 KB takes at least 6.7s. Long enough
+        # that a wait cut short, at reserve()'s default 5s, would show.
+        uploader, work, manifest = self.load(MAX_UPLOAD_RATE_MBPS='0.8')
+        self.backlog(uploader, work, manifest, 12, 64 * 1024)
+        rate = 100_000
+
+        took = self.run_uploads(uploader, manifest, lambda: manifest.pending_count() == 0)
+
+        self.assertGreaterEqual(took, 0.95 * (12 * 64 * 1024 - rate) / rate)
+
+
+class ThreadsEngineTest(EngineTests, unittest.TestCase):
+    ENGINE = 'threads'
+
+
+@unittest.skipUnless(HAVE_AIOBOTOCORE, 'needs aiobotocore')
+class AsyncEngineTest(EngineTests, unittest.TestCase):
+    ENGINE = 'async'
+
+
+def playlist(sequence, count, session=SESSION, target=2):
+    """A live playlist as FFmpeg writes one: `count` segments from `sequence` on."""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{target}',
+             f'#EXT-X-MEDIA-SEQUENCE:{sequence}']
+    for n in range(sequence, sequence + count):
+        seconds = int(session) + 2 * n
+        lines += [
+            '#EXTINF:2.000000,',
+            time.strftime('#EXT-X-PROGRAM-DATE-TIME:%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+            + '.%03d+0000' % (n % 1000),
+            f'test_hd_{session}_{n:06d}.ts',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+class PlaylistFollowerTest(unittest.TestCase):
+    """PlaylistFollower.read() is parse_playlist(), only cheaper."""
+
+    def setUp(self):
+        self.uploader, work = load()
+        self.path = work / 'live' / 'test_hd.m3u8'
+        self.follower = self.uploader.PlaylistFollower()
+
+    def write(self, text, rename=True):
+        """As FFmpeg does: whole, by rename, or in place with hls_flags -temp_file."""
+        if rename:
+            staged = self.path.with_suffix('.tmp')
+            staged.write_text(text)
+            staged.replace(self.path)
+        else:
+            with open(self.path, 'w') as fh:
+                fh.write(text)
+
+    def append(self, text):
+        with open(self.path, 'a') as fh:
+            fh.write(text)
+
+    def assertFollows(self, resumed=None):
+        """read() agrees with parse_playlist(), but for a half-written last line,
+        which it leaves for the next read. `resumed` asserts which way it got there."""
+        with mock.patch.object(self.follower, '_full', wraps=self.follower._full) as full:
+            entries, complete = self.follower.read(self.path)
+        if resumed is not None:
+            self.assertEqual(full.called, not resumed)
+
+        expected, expected_complete = self.uploader.parse_playlist(self.path)
+        got = [(e.name, e.duration, e.pdt, e.discontinuity) for e in entries]
+        want = [(e.name, e.duration, e.pdt, e.discontinuity) for e in expected]
+        if not self.path.read_bytes().endswith(b'\n') and got != want:
+            want = want[:-1]
+            expected_complete = max(0, len(want) - 1)
+        self.assertEqual(got, want)
+        self.assertEqual(complete, expected_complete)
+        return entries
+
+    def test_append(self):
+        self.write(playlist(0, 3))
+        self.assertEqual(len(self.assertFollows(resumed=False)), 3)
+        self.assertFollows(resumed=True)  # unchanged
+
+        text = playlist(0, 5)
+        self.append(text[len(playlist(0, 3)):])
+        self.assertEqual(len(self.assertFollows(resumed=True)), 5)
+
+    def test_window_slide(self):
+        self.write(playlist(0, 6))
+        self.assertFollows()
+        self.write(playlist(2, 6))
+        entries = self.assertFollows(resumed=True)
+        self.assertEqual([e.n for e in entries], list(range(2, 8)))
+
+        # Further than was remembered: parsed whole.
+        self.write(playlist(20, 6))
+        self.assertFollows(resumed=False)
+
+        # More dropped than the media sequence says: caught by the entry count.
+        self.write(playlist(23, 5).replace('SEQUENCE:23', 'SEQUENCE:22'))
+        self.assertEqual([e.n for e in self.assertFollows(resumed=False)], list(range(23, 28)))
+
+    def test_media_sequence_reset(self):
+        self.write(playlist(40, 6))
+        self.assertFollows()
+        self.write(playlist(0, 2, session='1785720000'))
+        entries = self.assertFollows(resumed=False)
+        self.assertEqual({e.session for e in entries}, {'1785720000'})
+
+        # The same numbers again, under a new session, in a file as long as before.
+        self.write(playlist(0, 2, session='1785730000'))
+        self.assertEqual({e.session for e in self.assertFollows()}, {'1785730000'})
+
+    def test_truncated_rewrite(self):
+        self.write(playlist(0, 6))
+        self.assertFollows()
+
+        # Caught halfway through an in-place rewrite, and through an append.
+        text = playlist(1, 6)
+        for cut in (len(text) // 2, text.rindex('test_hd') + 9, len(text) - 1):
+            self.write(text[:cut], rename=False)
+            self.assertFollows()
+        self.write(text, rename=False)
+        self.assertFollows()
+
+        full = playlist(1, 7)
+        self.append(full[len(text):len(full) - 5])
+        self.assertEqual(len(self.assertFollows()), 6)
+        self.append(full[len(full) - 5:])
+        self.assertEqual(len(self.assertFollows()), 7)
+
+    def test_a_random_walk(self):
+        # The four above in arbitrary order, with a fixed seed so a failure repeats.
+        rng = random.Random(20260802)
+        sequence, count, session, text = 0, 1, SESSION, ''
+        for _ in range(400):
+            step = rng.choice(('append', 'slide', 'reset', 'cut'))
+            if step == 'append':
+                count += rng.randint(1, 3)
+            elif step == 'slide':
+                sequence += rng.randint(1, count)
+            elif step == 'reset':
+                sequence, count = 0, rng.randint(1, 4)
+                session = str(int(session) + rng.randint(1, 10_000))
+            count = min(count, 12)
+            new = playlist(sequence, count, session)
+            if step == 'append' and new.startswith(text):
+                self.append(new[len(text):])
+            elif step == 'cut':
+                self.write(new[:rng.randrange(len(new))], rename=False)
+            else:
+                self.write(new, rename=rng.random() < 0.5)
+            text = self.path.read_text()
+            self.assertFollows()
+
+
+class ManifestSeenTest(unittest.TestCase):
+    """The in-memory sets answer as sqlite would, and change only on commit."""
+
+    def setUp(self):
+        self.uploader, self.work = load()
+        self.manifest = self.uploader.Manifest(str(self.work / 'manifest.sqlite'))
+        self.hour = time.strftime('%Y%m%d/%H', time.gmtime())
+
+    def pending(self, *ns):
+        paths = [str(self.work / 'live' / f'test_hd_{SESSION}_{n:06d}.ts') for n in ns]
+        self.manifest.record_pending_many(
+            (path, f'archive/test/{Path(path).name}', 'test', time.time()) for path in paths
+        )
+        return paths
+
+    def test_known_after_pending(self):
+        paths = self.pending(1, 2)
+        other = str(self.work / 'live' / f'test_hd_{SESSION}_000003.ts')
+        self.assertEqual(self.manifest.known_many(paths + [other]), set(paths))
+        # And from sqlite, for the next process.
+        fresh = self.uploader.Manifest(str(self.work / 'manifest.sqlite'))
+        self.assertEqual(fresh.known_many(paths + [other]), set(paths))
+
+    def test_indexed_misses_are_answered_from_sqlite(self):
+        self.manifest.record_indexed_many('test', [(SESSION, 1, 0, self.hour)])
+        self.manifest.record_indexed_many('test', [(SESSION, 2, 1, '20200101/00')])
+        keys = [(SESSION, 1), (SESSION, 2), (SESSION, 3)]
+        self.assertEqual(self.manifest.already_indexed_many('test', keys), set(keys[:2]))
+
+        # Too old to be loaded at startup, but still indexed, and remembered once asked.
+        fresh = self.uploader.Manifest(str(self.work / 'manifest.sqlite'))
+        self.assertNotIn(('test', SESSION, 2), fresh._indexed)
+        self.assertEqual(fresh.already_indexed_many('test', keys), set(keys[:2]))
+        self.assertIn(('test', SESSION, 2), fresh._indexed)
+        self.assertEqual(fresh.already_indexed_many('other', keys), set())
+
+    def test_a_rolled_back_batch_is_not_remembered(self):
+        with self.assertRaises(RuntimeError):
+            with self.manifest.batch():
+                paths = self.pending(1)
+                self.manifest.record_indexed_many('test', [(SESSION, 1, 0, self.hour)])
+                # Not until the batch commits.
+                self.assertEqual(self.manifest.known_many(paths), set())
+                raise RuntimeError
+
+        self.assertEqual(self.manifest.known_many(paths), set())
+        self.assertEqual(self.manifest.already_indexed_many('test', [(SESSION, 1)]), set())
+
+        with self.manifest.batch():
+            paths = self.pending(1)
+        self.assertEqual(self.manifest.known_many(paths), set(paths))
+
+    def test_forget_prunes(self):
+        path, = self.pending(1)
+        self.manifest.record_indexed_many('test', [(SESSION, 1, 0, self.hour)])
+
+        self.manifest.forget(path)
+
+        self.assertEqual(self.manifest.known_many([path]), set())
+        self.assertNotIn(('test', SESSION, 1), self.manifest._indexed)
+        # The index row stays; only the memory of it went.
+        self.assertEqual(self.manifest.already_indexed_many('test', [(SESSION, 1)]),
+                         {(SESSION, 1)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Checks for the HLS session tracker's reporter, against a stub of the API.
+
+  python3 -m unittest scripts/test_hls_session_tracker.py
+
+Needs requests importable, because the tracker imports it.
+"""
+
+import gzip
+import importlib.util
+import json
+import logging
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+TRACKER = Path(__file__).resolve().parent / 'hls_session_tracker.py'
+
+# basicConfig() does nothing once the root logger has a handler, so the tracker's
+# own call, with its FileHandler under /var/log, is skipped.
+logging.basicConfig(level=logging.CRITICAL)
+spec = importlib.util.spec_from_file_location('hls_session_tracker', TRACKER)
+tracker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tracker)
+
+
+class StubApi(ThreadingHTTPServer):
+    """
+    Answers the batch probe if `batch`, taking up to `max_events` at a time, and
+    records the paths posted to and the events batches carried.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, batch, max_events=100):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.batch = batch
+        self.max_events = max_events
+        self.posted = []
+        self.events = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.server.batch:
+            self.reply(200, {'version': 1, 'max_events': self.server.max_events, 'gzip': True})
+        else:
+            self.reply(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if self.path.endswith('/session/events'):
+            self.server.events += json.loads(body)['events']
+        self.server.posted.append(self.path)
+        self.reply(200, {'status': 'ok'})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_reporter(test, batch, **kwargs):
+    """A reporter against a fresh stub, both stopped when `test` ends."""
+    api = StubApi(batch)
+    test.addCleanup(api.shutdown)
+    tracker.API_ENDPOINT = f'http://127.0.0.1:{api.server_port}/api/hls'
+    reporter = tracker.Reporter({}, workers=1, **kwargs)
+    reporter.start()
+    test.addCleanup(reporter.stop, 1)
+    return api, reporter
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class FreshClockTest(unittest.TestCase):
+    """A tracker started with the host, when time.monotonic() is seconds old."""
+
+    def setUp(self):
+        self.clock = mock.patch.object(tracker.time, 'monotonic', return_value=5.0)
+        self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def test_batch_support_is_found_at_start(self):
+        api, reporter = start_reporter(self, batch=True)
+
+        self.assertTrue(wait_for(lambda: reporter.batch is not None))
+        reporter.submit('start', {'session': 'a'})
+        reporter.flush()
+        self.assertTrue(wait_for(lambda: api.posted == ['/api/hls/session/events']))
+
+    def test_without_batch_support_events_go_one_each_from_the_start(self):
+        api, reporter = start_reporter(self, batch=False)
+
+        reporter.submit('start', {'session': 'a'})
+        self.assertTrue(wait_for(lambda: api.posted == ['/api/hls/session/start']))
+        self.assertIsNone(reporter.batch)
+
+
+class BatchHeartbeatTest(unittest.TestCase):
+    """Heartbeats while batching, for more sessions than the queue holds."""
+
+    SESSIONS = 500
+
+    def setUp(self):
+        self.api, self.reporter = start_reporter(self, batch=True, size=100)
+        self.assertTrue(wait_for(lambda: self.reporter.batch is not None))
+
+    def heartbeats(self, round):
+        for n in range(self.SESSIONS):
+            self.reporter.submit('heartbeat', {'session': f's{n}', 'segments_watched': round})
+
+    def test_every_session_gets_its_heartbeat(self):
+        self.heartbeats(1)
+        self.reporter.flush()
+
+        self.assertTrue(wait_for(lambda: len(self.api.events) == self.SESSIONS))
+        self.assertEqual({e['session'] for e in self.api.events}, {f's{n}' for n in range(self.SESSIONS)})
+        self.assertEqual(self.reporter.stats()['dropped'], {})
+
+    def test_only_the_latest_heartbeat_per_session_is_sent(self):
+        self.heartbeats(1)
+        self.heartbeats(2)
+        self.reporter.submit('end', {'session': 's0'})
+        self.reporter.flush()
+
+        self.assertTrue(wait_for(lambda: len(self.api.events) == self.SESSIONS))
+        self.assertEqual(self.api.events[0], {'type': 'end', 'session': 's0'})
+        self.assertEqual({e['segments_watched'] for e in self.api.events[1:]}, {2})
+
+
+class ModeSwitchTest(unittest.TestCase):
+    """The API gaining the batch endpoint while the workers wait for events."""
+
+    def test_a_waiting_worker_hands_its_event_to_the_batch(self):
+        api, reporter = start_reporter(self, batch=False)
+        self.assertTrue(wait_for(lambda: reporter.per_event.is_set()))
+        time.sleep(0.1)  # the worker is in queue.get()
+
+        api.batch = True
+        reporter.probe()
+        reporter.submit('start', {'session': 'a'})
+        self.assertTrue(wait_for(lambda: reporter.queue.qsize() == 0))  # taken by the worker
+        reporter.flush()
+
+        self.assertTrue(wait_for(lambda: api.posted))
+        time.sleep(0.1)
+        self.assertEqual(api.posted, ['/api/hls/session/events'])
+        self.assertEqual(api.events, [{'type': 'start', 'session': 'a'}])
+
+
+class ProcessLinesTest(unittest.TestCase):
+    """A batch of log lines with one in it that fails."""
+
+    def test_a_bad_line_costs_only_itself(self):
+        hls = tracker.HLSSessionTracker()
+        lines = [f'10.0.0.{n}|s{n}|2026-08-15T12:00:0{n}+00:00|/hls/prime_hd.m3u8|200|-' for n in range(3)]
+        bad = '2026-08-15T12:00:01+00:00'
+        real = hls.parser.timestamp
+
+        def timestamp(value):
+            if value == bad:
+                raise RuntimeError('unparseable')
+            return real(value)
+
+        with mock.patch.object(hls.parser, 'timestamp', timestamp), \
+                mock.patch.object(hls.reporter, 'submit'):
+            hls.process_lines(lines)
+
+        self.assertEqual(sorted(hls.sessions), ['s0', 's2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
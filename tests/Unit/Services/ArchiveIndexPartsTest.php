@@ -0,0 +1,130 @@
+<?php
+
+namespace Tests\Unit\Services;
+
+use App\Services\ArchivePlaylistService;
+use Carbon\CarbonImmutable;
+use Illuminate\Support\Facades\Config;
+use Illuminate\Support\Facades\Storage;
+use Tests\TestCase;
+
+/**
+ * While an hour is open the uploader sends its index as append-only part objects, and
+ * only writes index.m3u8, gzipped, once the hour is over. These pin that a cut reads the
+ * same segments from either form, including the in-between states a merge of parts leaves.
+ */
+class ArchiveIndexPartsTest extends TestCase
+{
+    protected function setUp(): void
+    {
+        parent::setUp();
+
+        Config::set('app.timezone', 'UTC');
+        date_default_timezone_set('UTC');
+
+        Config::set('stream.archive_disk', 'archive-test');
+        Storage::fake('archive-test');
+
+        // The hour under test is the one in progress.
+        $this->travelTo(CarbonImmutable::parse('2026-08-15T12:30:00Z'));
+    }
+
+    public function test_an_open_hour_is_read_from_its_parts(): void
+    {
+        $index = $this->index(6);
+        $this->writePart(0, substr($index, 0, $this->entryEnd($index, 3)));
+        $this->writePart($this->entryEnd($index, 3), substr($index, $this->entryEnd($index, 3)));
+
+        $this->assertSame(range(0, 5), $this->sequences());
+    }
+
+    public function test_a_merged_part_overlapping_one_not_yet_deleted_counts_each_entry_once(): void
+    {
+        $index = $this->index(6);
+        // Parts 0 and 3 merged into a new part 0, which the uploader writes before
+        // deleting part 3.
+        $this->writePart(0, substr($index, 0, $this->entryEnd($index, 5)));
+        $this->writePart($this->entryEnd($index, 3), substr($index, $this->entryEnd($index, 3)));
+
+        $this->assertSame(range(0, 5), $this->sequences());
+    }
+
+    public function test_a_listing_with_a_gap_falls_back_to_the_hour_file(): void
+    {
+        $index = $this->index(6);
+        $this->writePart($this->entryEnd($index, 3), substr($index, $this->entryEnd($index, 3)));
+        Storage::disk('archive-test')->put('archive/prime/20260815/12/index.m3u8', $this->index(2));
+
+        $this->assertSame([0, 1], $this->sequences());
+    }
+
+    public function test_a_settled_hour_prefers_its_compacted_index(): void
+    {
+        $this->travelTo(CarbonImmutable::parse('2026-08-15T18:00:00Z'));
+
+        // Left over from a compaction that wrote the index but died before deleting.
+        $this->writePart(0, $this->index(3));
+        Storage::disk('archive-test')->put('archive/prime/20260815/12/index.m3u8', $this->index(6));
+
+        $this->assertSame(range(0, 5), $this->sequences());
+    }
+
+    public function test_a_settled_hour_that_was_never_compacted_is_read_from_its_parts(): void
+    {
+        $this->travelTo(CarbonImmutable::parse('2026-08-15T18:00:00Z'));
+
+        $this->writePart(0, $this->index(4));
+
+        $this->assertSame(range(0, 3), $this->sequences());
+    }
+
+    public function test_a_compacted_hour_stored_gzipped_reads_the_same(): void
+    {
+        $this->travelTo(CarbonImmutable::parse('2026-08-15T18:00:00Z'));
+
+        Storage::disk('archive-test')->put('archive/prime/20260815/12/index.m3u8', gzencode($this->index(6)));
+
+        $this->assertSame(range(0, 5), $this->sequences());
+    }
+
+    protected function sequences(): array
+    {
+        $segments = app(ArchivePlaylistService::class)->segmentsInRange(
+            'prime',
+            CarbonImmutable::parse('2026-08-15T12:00:00Z'),
+            CarbonImmutable::parse('2026-08-15T13:00:00Z'),
+        );
+
+        return array_column($segments, 'seq');
+    }
+
+    protected function index(int $segments): string
+    {
+        $index = "#EXTM3U\n#EXT-X-VERSION:6\n#EXT-X-TARGETDURATION:2\n#EXT-X-INDEPENDENT-SEGMENTS\n";
+
+        foreach (range(0, $segments - 1) as $n) {
+            $index .= '#EXT-X-ARCHIVE-SEQ:'.$n."\n";
+            $index .= '#EXTINF:2.000000,'."\n";
+            $index .= '#EXT-X-PROGRAM-DATE-TIME:2026-08-15T12:00:'.sprintf('%02d', $n * 2).".000+0000\n";
+            $index .= sprintf("prime_%%v_1700000000_%06d.ts\n", $n);
+        }
+
+        return $index;
+    }
+
+    /** Byte offset just past entry $n's URI line, where a flush could have split. */
+    protected function entryEnd(string $index, int $n): int
+    {
+        $uri = sprintf("prime_%%v_1700000000_%06d.ts\n", $n - 1);
+
+        return strpos($index, $uri) + strlen($uri);
+    }
+
+    protected function writePart(int $offset, string $body): void
+    {
+        Storage::disk('archive-test')->put(
+            sprintf('archive/prime/20260815/12/index.parts/%012d', $offset),
+            $body,
+        );
+    }
+}